@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Benchmark for computing the drawing data of campaign diagrams
+
+Times the original per kernel drawing info (get_drawing_data() and
+stitch_drawing_data() on the sorted kernels) against building the
+array based DrawingData of the cascade, and against re-deriving the
+rectangles from the cached DrawingData for a new bw_util_scaling,
+which is all that redrawing a cascade with a different scaling does.
+
+Usage: python benchmarks/bench_drawing.py [--max 100000]
+
+"""
+
+import argparse
+import logging
+
+from common import *
+
+
+def legacy(cascade, bw_util_scaling):
+    """ Sort the kernels and create and stitch the drawing info """
+
+    diagram = CampaignDiagram(cascade)
+
+    drawing_data, _, _ = diagram.get_drawing_data(bw_util_scaling, verbose=False)
+
+    return list(diagram.stitch_drawing_data(drawing_data))
+
+
+def rescale(data, scalings):
+    """ Derive the rectangles of data for each scaling """
+
+    return [data.rectangles(bw_util_scaling) for bw_util_scaling in scalings]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min", type=int, default=1000)
+    parser.add_argument("--max", type=int, default=100000)
+    parser.add_argument("--stages", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    scalings = [0.1, 0.25, 0.5]
+
+    print(f"{'kernels':>10} {'segments':>9} {'legacy (s)':>11} {'arrays (s)':>11}"
+          f" {'speedup':>8} {'rescale (s)':>12}")
+
+    for count in sizes(args.min, args.max):
+        cascade = Cascade(make_kernels(count, stages=args.stages)).throttle()
+        kernels = cascade.kernels
+
+        stitched, legacy_time = timed(legacy, cascade, 0.25)
+        data, data_time = timed(DrawingData.fromKernels, kernels)
+        _, rescale_time = timed(rescale, data, scalings)
+
+        assert len(data) == len(stitched)
+
+        print(f"{len(kernels):10d} {len(data):9d} {legacy_time:11.3f} {data_time:11.3f}"
+              f" {legacy_time / data_time:7.1f}x {rescale_time / len(scalings):12.5f}")
+
+
+if __name__ == "__main__":
+    main()
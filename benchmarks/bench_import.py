@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Benchmark for the time to import the package
+
+Times importing campaign_diagram in fresh interpreters (against
+importing numpy alone, which the package always needs), and checks
+that the slow optional modules (matplotlib, ruamel.yaml, ...) are
+only imported when they are used. It exits with an error if any of
+them is imported with the package or if the import takes longer than
+--limit seconds more than numpy, so it can guard against regressions.
+
+Usage: python benchmarks/bench_import.py [--runs 10] [--limit 0.2]
+
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that should not be imported by "import campaign_diagram"
+LAZY_MODULES = ["matplotlib", "ruamel.yaml", "deprecated", "concurrent.futures.process"]
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def run(code):
+    """ Run code in a fresh interpreter and return its output """
+
+    return subprocess.run([sys.executable, "-c", code],
+                          cwd=ROOT,
+                          check=True,
+                          capture_output=True,
+                          text=True).stdout
+
+
+def import_time(module, runs):
+    """ Return the median time to import module in a fresh interpreter """
+
+    code = ("import time\n"
+            "start = time.perf_counter()\n"
+            f"import {module}\n"
+            "print(time.perf_counter() - start)\n")
+
+    return statistics.median(float(run(code)) for _ in range(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--limit", type=float, default=0.2)
+    args = parser.parse_args()
+
+    numpy_time = import_time("numpy", args.runs)
+    package_time = import_time("campaign_diagram", args.runs)
+
+    print(f"{'numpy':30} {numpy_time:8.3f} s")
+    print(f"{'campaign_diagram':30} {package_time:8.3f} s")
+
+    loaded = run("import sys\n"
+                 "import campaign_diagram\n"
+                 f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))\n").split()
+
+    for module in LAZY_MODULES:
+        print(f"{module:30} {'imported' if module in loaded else 'lazy':>8}")
+
+    failures = []
+
+    if loaded:
+        failures.append(f"imported with the package: {', '.join(loaded)}")
+
+    if package_time - numpy_time > args.limit:
+        failures.append(f"import takes {package_time - numpy_time:.3f} s more than numpy"
+                        f" (limit {args.limit} s)")
+
+    if failures:
+        sys.exit("FAILED: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
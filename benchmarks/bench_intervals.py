@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Size-scaling benchmark for building Intervals
+
+Compares the sweep-line interval builder against the original
+list-based algorithm (which re-queued remainders with
+events.insert(0, ...) and rescanned every pending event for each
+interval). The original algorithm is quadratic, so it is only run up
+to --legacy-max kernels. With --trace the sweep is also timed with
+an IntervalTracer installed, and its event counts are printed.
+
+Usage: python benchmarks/bench_intervals.py [--max 1000000] [--legacy-max 10000] [--trace]
+
+"""
+
+import argparse
+import logging
+
+from common import *
+
+
+def legacy_group_kernels_into_intervals(kernels):
+    """The original O(n^2) grouping algorithm (without logging)"""
+
+    intervals = []
+    events = list(kernels)
+
+    while events:
+        kernel = events.pop(0)
+
+        current_start_time = kernel.start
+        min_end_time = kernel.end
+
+        active_kernels = [kernel]
+        while events and events[0].start == current_start_time:
+            next_kernel = events.pop(0)
+            active_kernels.append(next_kernel)
+            min_end_time = min(min_end_time, next_kernel.end)
+
+        for event in events:
+            min_end_time = min(min_end_time, event.start)
+
+        updated_kernels = []
+
+        for idx in reversed(range(len(active_kernels))):
+            active_kernel = active_kernels[idx]
+
+            if active_kernel.end == min_end_time:
+                updated_kernels.append(active_kernel.copy())
+            else:
+                first_part, remainder = active_kernel.split(min_end_time)
+                if first_part is not None:
+                    updated_kernels.append(first_part)
+                if remainder is not None:
+                    events.insert(0, remainder)
+
+        interval = Interval()
+        interval.kernels = updated_kernels
+        intervals.append(interval)
+
+    return intervals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min", type=int, default=1000)
+    parser.add_argument("--max", type=int, default=1000000)
+    parser.add_argument("--legacy-max", type=int, default=10000)
+    parser.add_argument("--stages", type=int, default=3)
+    parser.add_argument("--trace", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    print(f"{'kernels':>10} {'intervals':>10} {'sweep (s)':>10} {'legacy (s)':>11} {'speedup':>8}")
+
+    for count in sizes(args.min, args.max):
+        kernels = make_kernels(count, stages=args.stages)
+
+        intervals, sweep_time = timed(Intervals, kernels)
+
+        if count <= args.legacy_max:
+            legacy, legacy_time = timed(legacy_group_kernels_into_intervals, kernels)
+            assert len(legacy) == len(intervals)
+            legacy_column = f"{legacy_time:11.3f} {legacy_time / sweep_time:7.1f}x"
+        else:
+            legacy_column = f"{'-':>11} {'-':>8}"
+
+        print(f"{count:10d} {len(intervals):10d} {sweep_time:10.3f} {legacy_column}")
+
+        if args.trace:
+            with tracing() as tracer:
+                _, trace_time = timed(Intervals, kernels)
+
+            counts = ", ".join(f"{event}={count}" for event, count in sorted(tracer.counts.items()))
+            print(f"{'':10} traced {trace_time:10.3f} s ({counts})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""Load-time benchmark for kernel trace files
+
+Writes a YAML kernel trace (and the same trace as JSON Lines and CSV)
+and compares loading it with Cascade.fromYAML() against the streaming
+Cascade.fromFile(), building either Kernel objects or a KernelStore,
+and against reloading the cascade from a binary cascade file (see
+Cascade.toBinary()). Before timing, a YAML file with anchors,
+aliases and other scalar forms is loaded both ways to check that
+fromFile() reads the same kernels as fromYAML(), with both the pure
+Python and the C parser of ruamel.yaml (if ruamel.yaml.clib is
+installed).
+
+Usage: python benchmarks/bench_load.py [--kernels 20000]
+
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+
+from common import *
+
+
+def write_traces(directory, count):
+    """ Write a trace of count kernels in each format """
+
+    kernels = make_sequential_kernels(count)
+    fields = ("name", "duration", "compute_util", "bw_util")
+
+    paths = {fmt: os.path.join(directory, f"trace.{fmt}") for fmt in ("yaml", "jsonl", "csv")}
+
+    with open(paths["yaml"], "w") as file:
+        file.write("cascade:\n  name: Benchmark Cascade\n  kernels:\n")
+        for kernel in kernels:
+            file.write(f"    - name: {kernel.name}\n"
+                       f"      duration: {kernel.duration}\n"
+                       f"      compute_util: {kernel.compute_util}\n"
+                       f"      bw_util: {kernel.bw_util}\n")
+
+    with open(paths["jsonl"], "w") as file:
+        file.write(json.dumps({"cascade": {"name": "Benchmark Cascade"}}) + "\n")
+        for kernel in kernels:
+            file.write(json.dumps({field: getattr(kernel, field) for field in fields}) + "\n")
+
+    with open(paths["csv"], "w") as file:
+        file.write(",".join(fields) + "\n")
+        for kernel in kernels:
+            file.write(",".join(str(getattr(kernel, field)) for field in fields) + "\n")
+
+    return paths
+
+
+EDGE_CASES = """\
+cascade:
+  name: &name Edge Cases
+  kernels:
+    - &first
+      name: A
+      duration: 1_000
+      compute_util: 0.5
+      bw_util: 0x10
+    - *first
+    - <<: *first
+      name: B
+      duration: 1e3
+    - {name: C, duration: .5, compute_util: 010, bw_util: 0o10}
+    - {name: *name, duration: 2, compute_util: .25, bw_util: +1}
+    - {name: "0x10", duration: 1.5E+1, compute_util: 0, bw_util: 0.125}
+"""
+
+
+def kernel_fields(cascade):
+    """ The attributes of the kernels of a cascade read from a file """
+
+    return [(kernel.name, kernel.duration, kernel.compute_util, kernel.bw_util)
+            for kernel in cascade.kernels]
+
+
+def yaml_parser():
+    """ The name of the parser used for YAML unless pure is requested """
+
+    from ruamel.yaml import YAML
+
+    return YAML(typ="safe").Parser.__name__
+
+
+def record_fields(reader):
+    """ The attributes of the kernels read by a KernelReader """
+
+    return [(record["name"], record["duration"], record["compute_util"], record["bw_util"])
+            for record in reader]
+
+
+def check_yaml(directory):
+    """ Check that fromFile() reads the same kernels as fromYAML() """
+
+    path = os.path.join(directory, "edge_cases.yaml")
+
+    with open(path, "w") as file:
+        file.write(EDGE_CASES)
+
+    expected = Cascade.fromYAML(path)
+
+    for store in (False, True):
+        cascade = Cascade.fromFile(path, store=store)
+        assert cascade.name == expected.name
+        assert kernel_fields(cascade) == kernel_fields(expected)
+
+    for pure in (True, False):
+        reader = KernelReader(path, pure=pure)
+        assert record_fields(reader) == kernel_fields(expected)
+        assert reader.cascade["name"] == expected.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kernels", type=int, default=20000)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        check_yaml(directory)
+        print(f"YAML checked with the Python parser and {yaml_parser()}")
+
+        paths = write_traces(directory, args.kernels)
+
+        baseline, baseline_time = timed(Cascade.fromYAML, paths["yaml"])
+        print(f"{'fromYAML (yaml)':28} {baseline_time:8.3f} s")
+
+        for fmt, path in paths.items():
+            for store in (False, True):
+                cascade, elapsed = timed(Cascade.fromFile, path, store=store)
+                assert kernel_fields(cascade) == kernel_fields(baseline)
+
+                label = f"fromFile ({fmt}{', store' if store else ''})"
+                print(f"{label:28} {elapsed:8.3f} s {baseline_time / elapsed:6.1f}x")
+
+        for pure in (True, False):
+            fields, elapsed = timed(record_fields, KernelReader(paths["yaml"], pure=pure))
+            assert fields == kernel_fields(baseline)
+
+            label = f"KernelReader ({'pure' if pure else yaml_parser()})"
+            print(f"{label:28} {elapsed:8.3f} s {baseline_time / elapsed:6.1f}x")
+
+        binary = os.path.join(directory, "trace.cdc")
+        baseline.toBinary(binary)
+
+        for mmap in (False, True):
+            cascade, elapsed = timed(Cascade.fromBinary, binary, mmap=mmap)
+            assert len(cascade) == len(baseline)
+            assert cascade.duration() == baseline.duration()
+
+            label = f"fromBinary ({'mmap' if mmap else 'read'})"
+            print(f"{label:28} {elapsed:8.3f} s {baseline_time / elapsed:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Benchmark for level of detail (LOD) rendering of campaign diagrams
+
+Times saving a throttled cascade as SVG with render(lod=True), which
+draws one band per pixel of the figure width, against the full (batch)
+rendering of every kernel, and prints the size of the output. The
+full rendering grows with the number of kernels, so it is only run
+up to --full-max kernels.
+
+Usage: python benchmarks/bench_lod.py [--max 1000000] [--full-max 10000]
+
+"""
+
+import argparse
+import io
+import logging
+
+from common import *
+
+
+def save(diagram, lod):
+    """ Save diagram as SVG and return the size of the output """
+
+    output = io.BytesIO()
+    diagram.save(output, format="svg", lod=lod)
+
+    return len(output.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min", type=int, default=1000)
+    parser.add_argument("--max", type=int, default=1000000)
+    parser.add_argument("--full-max", type=int, default=10000)
+    parser.add_argument("--stages", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    print(f"{'kernels':>10} {'lod (s)':>8} {'lod (KiB)':>10} {'full (s)':>9} {'full (KiB)':>11}")
+
+    for count in sizes(args.min, args.max):
+        cascade = Cascade(make_kernels(count, stages=args.stages)).throttle()
+        diagram = CampaignDiagram(cascade)
+
+        # Build the intervals (and their time index) up front
+        cascade.intervals.time_index()
+
+        lod_size, lod_time = timed(save, diagram, True)
+
+        if count <= args.full_max:
+            full_size, full_time = timed(save, diagram, False)
+            full_columns = f"{full_time:9.3f} {full_size / 1024:11.0f}"
+        else:
+            full_columns = f"{'-':>9} {'-':>11}"
+
+        print(f"{len(cascade):10d} {lod_time:8.3f} {lod_size / 1024:10.0f} {full_columns}")
+
+
+if __name__ == "__main__":
+    main()
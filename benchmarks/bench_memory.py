@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""Memory benchmark for kernels and intervals
+
+Measures the memory per kernel of the split kernels of a pipelined
+and throttled cascade with tracemalloc, and compares the footprint of
+Kernel and Interval objects against the original classes, which kept
+their attributes (including the colors of each kernel) in a
+per-object __dict__.
+
+Usage: python benchmarks/bench_memory.py [--kernels 100000]
+
+"""
+
+import argparse
+import logging
+import tracemalloc
+
+from common import *
+
+
+class LegacyKernel:
+    """ The original Kernel attributes """
+
+    def __init__(self, name, start=0, duration=0, compute_util=0, bw_util=0,
+                 origin=None, bw_util_limit=1.0, throttled_duration=0):
+
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.throttled_duration = throttled_duration
+        self.compute_util = compute_util
+        self.bw_util = bw_util
+        self.origin = self if origin is None else origin
+        self.bw_util_limit = bw_util_limit
+        self.compute_color = None
+        self.bw_color = None
+
+
+class LegacyInterval:
+    """ The original Interval attributes """
+
+    def __init__(self):
+        self.kernels = []
+
+
+def allocated(function, *args):
+    """ Return the result of function and the bytes it left allocated """
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    result = function(*args)
+
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return result, after - before
+
+
+def make_fragments(kernel_class, interval_class, count):
+    """ Create count colored kernel fragments in intervals of 3 """
+
+    origin = kernel_class(name="Einsum0", duration=10, compute_util=0.5, bw_util=0.25)
+    origin.compute_color = "#0000FF"
+    origin.bw_color = "#7F7FFF"
+
+    intervals = []
+
+    for n in range(count):
+        if n % 3 == 0:
+            intervals.append(interval_class())
+
+        kernel = kernel_class(name=origin.name,
+                              start=float(n // 3),
+                              duration=1.0 + n,
+                              compute_util=0.5 / (n + 1),
+                              bw_util=0.25 / (n + 1),
+                              origin=origin)
+        kernel.compute_color = origin.compute_color
+        kernel.bw_color = origin.bw_color
+
+        intervals[-1].kernels.append(kernel)
+
+    return intervals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kernels", type=int, default=100000)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    _, legacy_bytes = allocated(make_fragments, LegacyKernel, LegacyInterval, args.kernels)
+    _, compact_bytes = allocated(make_fragments, Kernel, Interval, args.kernels)
+
+    print(f"{'fragments (legacy)':30} {legacy_bytes / args.kernels:8.1f} bytes/kernel")
+    print(f"{'fragments (slots)':30} {compact_bytes / args.kernels:8.1f} bytes/kernel"
+          f" {legacy_bytes / compact_bytes:6.2f}x")
+
+    # A realistic cascade: split fragments of a throttled pipeline
+    base = Cascade(make_sequential_kernels(4), sequential=True)
+    tiles = max(1, args.kernels // 8)
+
+    def throttled():
+        cascade = base.tile(tiles).pipeline(stages=3).throttle()
+        cascade.kernels
+        return cascade
+
+    cascade, cascade_bytes = allocated(throttled)
+
+    print(f"{'throttled pipeline':30} {cascade_bytes / len(cascade):8.1f} bytes/kernel"
+          f" ({len(cascade)} kernels)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Regression benchmark for pipelining a tiled cascade
+
+Times Cascade.pipeline() on a tiled cascade with many tiles against
+the original version, which deep-copied the kernels, padded each stage
+with zero-duration spacer kernels and zipped the stages together, and
+checks that both produce the same schedule.
+
+Usage: python benchmarks/bench_pipeline.py [--max-tiles 100000] [--stages 3]
+
+"""
+
+import argparse
+import copy
+import logging
+
+from common import *
+
+
+def legacy_pipeline(cascade, stages=2, spread=False):
+    """ The original Cascade.pipeline() """
+
+    tasks = []
+
+    orig_kernels = copy.deepcopy(cascade.kernels)
+
+    for stage in range(stages):
+        name = orig_kernels[stage].name
+        task = legacy_spacers(stage, name)
+        task.extend(orig_kernels[stage::stages])
+        task.extend(legacy_spacers(stages-stage-1, name))
+
+        tasks.append(task)
+
+    new_kernels = []
+    previous_end = 0
+
+    for kernels in zip(*tasks):
+
+        max_duration = max([kernel.duration for kernel in kernels])
+
+        for kernel in kernels:
+
+            if kernel.duration == 0:
+                continue
+
+            kernel.set_start(previous_end)
+
+            if spread:
+                if kernel.duration !=0 and kernel.duration < max_duration:
+                    kernel.dilate(max_duration/kernel.duration)
+
+            new_kernels.append(kernel)
+
+        previous_end += max_duration
+
+    return Cascade(name=f"{cascade.name} (Pipelined)",
+                   kernels=new_kernels)
+
+
+def legacy_spacers(count, name=None):
+
+    spacer = Kernel(name=name,
+                    duration=0,
+                    compute_util=0,
+                    bw_util=0)
+
+    return [copy.copy(spacer) for _ in range(count)]
+
+
+def schedule(cascade):
+    """ The start, duration and utilizations of each kernel """
+
+    return [(kernel.name, kernel.start, kernel.duration, kernel.compute_util, kernel.bw_util)
+            for kernel in cascade.kernels]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-tiles", type=int, default=10)
+    parser.add_argument("--max-tiles", type=int, default=100000)
+    parser.add_argument("--stages", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    base = Cascade(make_sequential_kernels(args.stages), sequential=True)
+
+    print(f"{'tiles':>8} {'spread':>6} {'pipeline (s)':>13} {'legacy (s)':>11} {'speedup':>8}")
+
+    for tiles in sizes(args.min_tiles, args.max_tiles):
+        tiled = base.tile(tiles)
+
+        for spread in (False, True):
+            pipelined, pipeline_time = timed(tiled.pipeline, stages=args.stages, spread=spread)
+            legacy, legacy_time = timed(legacy_pipeline, tiled, stages=args.stages, spread=spread)
+
+            assert schedule(pipelined) == schedule(legacy)
+
+            print(f"{tiles:8d} {str(spread):>6} {pipeline_time:13.3f} {legacy_time:11.3f}"
+                  f" {legacy_time / pipeline_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""Benchmark for rendering campaign diagrams without matplotlib
+
+Times saving a throttled cascade as a PNG with RasterDiagram (at full
+detail and with lod=True) against CampaignDiagram, which renders the
+same drawing data with matplotlib. The matplotlib rendering is only
+run up to --mpl-max kernels.
+
+Usage: python benchmarks/bench_raster.py [--max 1000000] [--mpl-max 100000]
+
+"""
+
+import argparse
+import io
+import logging
+
+from common import *
+
+
+def save(diagram, **kwargs):
+    """ Save diagram as a PNG and return the size of the output """
+
+    output = io.BytesIO()
+
+    if isinstance(diagram, CampaignDiagram):
+        diagram.save(output, format="png", **kwargs)
+    else:
+        diagram.save(output, **kwargs)
+
+    return len(output.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min", type=int, default=1000)
+    parser.add_argument("--max", type=int, default=1000000)
+    parser.add_argument("--mpl-max", type=int, default=100000)
+    parser.add_argument("--stages", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    print(f"{'kernels':>10} {'raster (s)':>11} {'lod (s)':>8} {'mpl (s)':>8} {'speedup':>8}")
+
+    for count in sizes(args.min, args.max):
+        cascade = Cascade(make_kernels(count, stages=args.stages)).throttle()
+
+        # Share the (cached) drawing data between the diagrams
+        cascade.drawing_data()
+
+        raster = RasterDiagram(cascade)
+
+        _, raster_time = timed(save, raster)
+        _, lod_time = timed(save, raster, lod=True)
+
+        if count <= args.mpl_max:
+            _, mpl_time = timed(save, CampaignDiagram(cascade))
+            mpl_columns = f"{mpl_time:8.3f} {mpl_time / raster_time:7.1f}x"
+        else:
+            mpl_columns = f"{'-':>8} {'-':>8}"
+
+        print(f"{len(cascade):10d} {raster_time:11.3f} {lod_time:8.3f} {mpl_columns}")
+
+
+if __name__ == "__main__":
+    main()
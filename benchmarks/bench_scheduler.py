@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Makespan benchmark for the resource-aware pipeline scheduler
+
+Pipelines a tiled cascade whose stages together need more compute and
+bw than is available, and compares throttling the pipeline
+(Cascade.pipeline().throttle()) against list scheduling it
+(Cascade.pipeline(mode="list")) on makespan, peak utilization and
+run time.
+
+Usage: python benchmarks/bench_scheduler.py [--max-tiles 10000] [--stages 3] [--budget 32] [--seed 0] [--scale 2.0]
+
+"""
+
+import argparse
+import logging
+
+from common import *
+
+
+def make_cascade(stages, scale):
+    """ A sequential cascade with the utilizations scaled by scale """
+
+    kernels = make_sequential_kernels(stages)
+
+    for kernel in kernels:
+        kernel.compute_util *= scale
+        kernel.bw_util *= scale
+
+    return Cascade(kernels, sequential=True)
+
+
+def throttled_pipeline(cascade, stages):
+
+    return cascade.pipeline(stages=stages).throttle()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-tiles", type=int, default=10)
+    parser.add_argument("--max-tiles", type=int, default=10000)
+    parser.add_argument("--stages", type=int, default=3)
+    parser.add_argument("--budget", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=2.0)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    base = make_cascade(args.stages, args.scale)
+
+    print(f"{'tiles':>8} {'mode':>8} {'makespan':>10} {'peak cu':>8} {'peak bw':>8} {'time (s)':>9}")
+
+    for tiles in sizes(args.min_tiles, args.max_tiles):
+        tiled = base.tile(tiles)
+
+        throttled, throttle_time = timed(throttled_pipeline, tiled, args.stages)
+        scheduled, schedule_time = timed(tiled.pipeline,
+                                         stages=args.stages,
+                                         mode="list",
+                                         budget=args.budget,
+                                         seed=args.seed)
+
+        for mode, cascade, elapsed in (("throttle", throttled, throttle_time),
+                                       ("list", scheduled, schedule_time)):
+            stats = cascade.stats()
+            makespan = max(kernel.end for kernel in cascade.kernels)
+
+            print(f"{tiles:8d} {mode:>8} {makespan:10.1f} {stats['peak_compute_util']:8.2f}"
+                  f" {stats['peak_bw_util']:8.2f} {elapsed:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
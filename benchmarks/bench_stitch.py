@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Regression benchmark for stitching split kernels when drawing
+
+Times CampaignDiagram.stitch_drawing_data() on a throttled 3-stage
+pipeline with many tiles, against the original search that scanned
+forward through the rest of the drawing data for each piece of a
+kernel, and checks that both stitch the same way.
+
+Usage: python benchmarks/bench_stitch.py [--max-tiles 10000] [--legacy-max 1000]
+
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+from common import *
+
+
+def legacy_stitch_drawing_data(drawing_data):
+    """ The original O(n^2) stitching """
+
+    for n, info in enumerate(drawing_data):
+        found_it = False
+        next_info = None
+
+        for m, candidate_info in enumerate(drawing_data[n+1:]):
+            if info.origin == candidate_info.origin:
+                if info.compute_line.util == candidate_info.compute_line.util:
+                    info.extend(candidate_info)
+                    drawing_data[n+1+m] = info
+                    found_it = True
+                    break
+                else:
+                    next_info = candidate_info
+                    break
+            else:
+                if info.origin.name == candidate_info.origin.name:
+                    break
+
+        if found_it:
+            continue
+
+        yield info, next_info
+
+
+def stitched(stitch, diagram):
+    """ Run stitch on fresh drawing data and summarize what it draws """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        drawing_data, _, _ = diagram.get_drawing_data(0.25)
+
+    result, elapsed = timed(lambda: list(stitch(drawing_data)))
+
+    summary = [(info.compute_line.start,
+                info.compute_line.end,
+                info.compute_line.util,
+                None if next_info is None else next_info.compute_line.util)
+               for info, next_info in result]
+
+    return summary, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-tiles", type=int, default=10)
+    parser.add_argument("--max-tiles", type=int, default=10000)
+    parser.add_argument("--legacy-max", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    base = Cascade(make_sequential_kernels(3), sequential=True)
+
+    print(f"{'tiles':>8} {'pieces':>8} {'stitch (s)':>11} {'legacy (s)':>11} {'speedup':>8}")
+
+    for tiles in sizes(args.min_tiles, args.max_tiles):
+        cascade = base.tile(tiles).pipeline(stages=3).throttle()
+        diagram = CampaignDiagram(cascade)
+
+        summary, stitch_time = stitched(diagram.stitch_drawing_data, diagram)
+
+        if tiles <= args.legacy_max:
+            legacy_summary, legacy_time = stitched(legacy_stitch_drawing_data, diagram)
+            assert summary == legacy_summary
+            legacy_column = f"{legacy_time:11.3f} {legacy_time / stitch_time:7.1f}x"
+        else:
+            legacy_column = f"{'-':>11} {'-':>8}"
+
+        print(f"{tiles:8d} {len(cascade):8d} {stitch_time:11.4f} {legacy_column}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Benchmark for sweeping the pipeline design space
+
+Compares sweep_design_space() (in this process and across a process
+pool) against the loop it replaces, which tiles, pipelines and
+throttles the cascade afresh for every point of the grid, and checks
+that they give the same durations and average utilizations.
+
+Usage: python benchmarks/bench_sweep.py [--kernels 8] [--max-parts 1000] [--max-stages 4]
+
+"""
+
+import argparse
+import logging
+
+from common import *
+
+
+def loop_sweep(cascade, parts, stages, spread, throttle):
+    """ The grid evaluated one point at a time """
+
+    rows = []
+
+    for parts_value in parts:
+        for stages_value in stages:
+            for spread_value in spread:
+                for throttle_value in throttle:
+                    result = cascade.tile(parts_value).pipeline(stages=stages_value,
+                                                                spread=spread_value)
+                    if throttle_value:
+                        result = result.throttle()
+
+                    rows.append((result.duration(),
+                                 result.avg_compute_util(),
+                                 result.avg_bw_util()))
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kernels", type=int, default=8)
+    parser.add_argument("--max-parts", type=int, default=1000)
+    parser.add_argument("--max-stages", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    base = Cascade(make_sequential_kernels(args.kernels), sequential=True)
+
+    grid = dict(parts=list(sizes(1, args.max_parts)),
+                stages=list(range(1, args.max_stages + 1)),
+                spread=[False, True],
+                throttle=[False, True])
+
+    expected, loop_time = timed(loop_sweep, base, **grid)
+    print(f"{'loop':24} {loop_time:8.3f} s")
+
+    for processes in (1, args.processes):
+        rows, elapsed = timed(sweep_design_space, base, processes=processes, **grid)
+
+        assert [(row["duration"], row["avg_compute_util"], row["avg_bw_util"])
+                for row in rows] == expected
+
+        label = f"sweep_design_space ({processes or 'pool'})"
+        print(f"{label:24} {elapsed:8.3f} s {loop_time / elapsed:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
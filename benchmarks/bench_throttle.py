@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Benchmark for throttling a cascade
+
+Compares throttling the Interval instances of a cascade with the
+batched throttle of a KernelStore backed cascade, and checks that both
+give the same kernels. Also times Cascade.throttle(), which converts
+large cascades to a store for the batched throttle, and compares the
+memory allocated by throttling a deep copy of the intervals with
+Intervals.throttled(). Most of that saving comes from not copying the
+origins of the kernels: throttled() only shares the intervals before
+the first one that throttling shifts.
+
+Usage: python benchmarks/bench_throttle.py [--kernels 100000]
+
+"""
+
+import argparse
+import copy
+import logging
+import tracemalloc
+
+from common import *
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kernels", type=int, default=100000)
+    parser.add_argument("--stages", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger("campaign_diagram.intervals").setLevel(logging.WARNING)
+
+    intervals = Intervals(make_kernels(args.kernels, stages=args.stages))
+    store = KernelStore.fromIntervals(intervals)
+
+    # Splitting the kernels at the interval boundaries gives several
+    # times as many kernels as --kernels
+    print(f"{len(store)} kernels ({args.kernels} before splitting)"
+          f" in {store.num_intervals} intervals")
+
+    # Best of "repeat" runs, each on a fresh copy
+    object_time = store_time = throttled_time = cascade_time = float("inf")
+
+    for _ in range(args.repeat):
+        object_intervals = copy.deepcopy(intervals)
+        _, elapsed = timed(object_intervals.throttle)
+        object_time = min(object_time, elapsed)
+
+        store_intervals = Intervals.fromStore(store.copy())
+        _, elapsed = timed(store_intervals.throttle)
+        store_time = min(store_time, elapsed)
+
+        _, elapsed = timed(intervals.throttled)
+        throttled_time = min(throttled_time, elapsed)
+
+        cascade = Cascade.fromIntervals("bench", copy.deepcopy(intervals))
+        throttled_cascade, elapsed = timed(cascade.throttle)
+        cascade_time = min(cascade_time, elapsed)
+
+    print(f"Interval throttle: {object_time:8.3f} s")
+    print(f"Batched throttle:  {store_time:8.3f} s")
+    print(f"Speedup:           {object_time / store_time:8.1f}x")
+
+    # Cascade.throttle() used Intervals.throttled() for all cascades
+    print(f"Intervals.throttled(): {throttled_time:8.3f} s")
+    print(f"Cascade.throttle():    {cascade_time:8.3f} s"
+          f" ({throttled_time / cascade_time:.1f}x, incl. conversion to a store)")
+
+    expected = KernelStore.fromIntervals(object_intervals)
+    for result in (store_intervals.store, throttled_cascade.toStore()):
+        for attribute in KernelStore.columns:
+            assert (getattr(expected, attribute) == getattr(result, attribute)).all(), attribute
+
+    print("Throttled kernels match")
+
+    _, deepcopy_peak = peak_allocation(lambda: copy.deepcopy(intervals).throttle())
+    throttled, throttled_peak = peak_allocation(intervals.throttled)
+
+    shared = sum(new is old for new, old in zip(throttled, intervals))
+
+    print(f"Deep copy + throttle peak: {deepcopy_peak / 2**20:8.1f} MiB")
+    print(f"throttled() peak:          {throttled_peak / 2**20:8.1f} MiB"
+          f" ({shared} of {len(intervals)} intervals shared)")
+
+
+def peak_allocation(function):
+    """Run function and return (result, peak bytes allocated)"""
+
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, peak
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Shared helpers for the benchmark scripts"""
+
+import os
+import sys
+import time
+
+# Allow running the benchmarks from a source checkout
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from campaign_diagram import *
+
+
+def make_kernels(count, stages=2):
+    """Create a trace of "count" kernels in the shape of a pipeline
+
+    Each kernel overlaps the next "stages - 1" kernels, which gives
+    the interval builder the same kind of splitting work as a
+    pipelined and tiled cascade.
+
+    """
+
+    durations = [5, 10, 3, 7]
+    kernels = []
+
+    for n in range(count):
+        kernels.append(Kernel(name=f"Einsum{n % len(durations)}",
+                              start=(n // stages) * 4.0 + (n % stages),
+                              duration=durations[n % len(durations)],
+                              compute_util=0.2 + 0.1 * (n % 5),
+                              bw_util=0.1 + 0.15 * (n % 3)))
+
+    return kernels
+
+
+def make_sequential_kernels(count):
+    """Create a trace of "count" back-to-back kernels"""
+
+    durations = [5, 10, 3, 7]
+    kernels = []
+    last_end = 0
+
+    for n in range(count):
+        kernel = Kernel(name=f"Einsum{n % len(durations)}",
+                        start=last_end,
+                        duration=durations[n % len(durations)],
+                        compute_util=0.2 + 0.1 * (n % 5),
+                        bw_util=0.1 + 0.15 * (n % 3))
+        kernels.append(kernel)
+        last_end = kernel.end
+
+    return kernels
+
+
+def timed(function, *args, **kwargs):
+    """Run function and return (result, elapsed seconds)"""
+
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+
+    return result, time.perf_counter() - start
+
+
+def sizes(smallest, largest):
+    """Powers of ten from smallest to largest"""
+
+    size = smallest
+    while size <= largest:
+        yield size
+        size *= 10
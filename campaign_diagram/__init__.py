@@ -1,4 +1,12 @@
 from .kernel import *
 from .cascade import *
 from .intervals import *
+from .kernel_store import *
+from .kernel_reader import *
+from .cascade_file import *
+from .scheduler import *
+from .drawing_data import *
 from .campaign_diagram import *
+from .raster import *
+from .batch import *
+from .design_space import *
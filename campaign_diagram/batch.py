@@ -0,0 +1,82 @@
+import os
+import re
+import time
+
+from campaign_diagram.cascade import *
+from campaign_diagram.campaign_diagram import *
+
+
+def render_batch(cascades, output_dir, format="png", processes=None, **kwargs):
+    """Render many campaign diagrams in parallel
+
+    Each entry of cascades is a Cascade or the path of a YAML file
+    (see Cascade.fromYAML()). The diagrams are rendered across a pool
+    of "processes" worker processes (by default one per CPU, and with
+    processes=1 they are rendered in this process). Every worker has
+    its own matplotlib state and renders with CampaignDiagram.save(),
+    so no figures are shown or kept around.
+
+    Every diagram gets its colors from a new KernelColor (in the
+    order its kernel names first appear), so the colors of a diagram
+    do not depend on the other diagrams or on which process rendered
+    it.
+
+    Each diagram is saved in output_dir with the name
+    "<index>-<cascade name>.<format>", where index is the position of
+    the cascade in cascades. The other arguments are passed to
+    CampaignDiagram.save().
+
+    Returns a list with a dictionary for each cascade (in the order of
+    cascades) with the summary() of the diagram plus the "file" it was
+    saved in and the "seconds" taken to load (if needed), render and
+    save it.
+
+    """
+
+    cascades = list(cascades)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Zero pad the index so the files sort in order
+    width = max(4, len(str(len(cascades) - 1)))
+
+    jobs = [(index, cascade, output_dir, format, width, kwargs)
+            for index, cascade in enumerate(cascades)]
+
+    if processes == 1:
+        return [_render_job(job) for job in jobs]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_render_job, jobs))
+
+
+def output_name(index, name, format, width=4):
+    """ File name for the diagram of a cascade in a batch """
+
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_") or "cascade"
+
+    return f"{index:0{width}d}-{slug}.{format}"
+
+
+def _render_job(job):
+    """ Render one diagram of a batch (in a worker process) """
+
+    index, cascade, output_dir, format, width, kwargs = job
+
+    start = time.perf_counter()
+
+    if not isinstance(cascade, Cascade):
+        cascade = Cascade.fromYAML(cascade)
+
+    file = os.path.join(output_dir, output_name(index, cascade.name, format, width))
+
+    diagram = CampaignDiagram(cascade, color_map=KernelColor())
+
+    result = diagram.save(file, format=format, **kwargs)
+
+    result["file"] = file
+    result["seconds"] = time.perf_counter() - start
+
+    return result
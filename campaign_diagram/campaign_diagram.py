@@ -1,48 +1,356 @@
 import copy
+import os
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import matplotlib.colors as mcolors
+import numpy as np
 
 from campaign_diagram.cascade import *
 
+# Note: matplotlib is slow to import, so it is only imported (by the
+# functions that use it) when a diagram is drawn
+
 
 # Class to draw the plot using a list of Kernel objects
 class CampaignDiagram:
-    def __init__(self, cascade):
+    def __init__(self, cascade, color_map=None):
 
-        cascade.assign_colors()
+        # The colors of the kernels by name, which later changes to
+        # the colors of the cascade do not change
+        self.colors = dict(cascade.assign_colors(color_map))
         self.cascade = cascade
 
-        kernels = cascade.kernels
-        self.kernels =  sorted(kernels,
-                               key=lambda k: (k.start, -k.bw_util, k.compute_util, k.name))
+        # Sorted kernels (see kernels)
+        self._kernels = None
+
+        # Overflows found when the diagram was last drawn
+        self.overflows = []
+
+    @property
+    def kernels(self):
+        """The kernels of the cascade in drawing order
+
+        Only used by get_drawing_data(), so they are sorted on first use.
+
+        """
+
+        if self._kernels is None:
+            self._kernels = sorted(self.cascade.kernels,
+                                   key=lambda k: (k.start, -k.bw_util, k.compute_util, k.name))
+
+        return self._kernels
+
+    def draw(self, title=None, bw_util_scaling=0.25, batch=False, lod=False, resolution=None):
+        """Draw the campaign diagram
+
+        With batch=True the kernels are drawn with a few collections
+        (see DrawingCollections) instead of separate artists for each
+        kernel, which is much faster for large cascades.
+
+        With lod=True the diagram is drawn at a lower level of detail
+        as bands of resolution wide (by default one per pixel of the
+        width of the figure), see render_bands().
 
-    def draw(self, title=None, bw_util_scaling=0.25):
-        """Draw the campaign diagram """
+        """
 
         # Add some space before diagram
         print("")
 
+        import matplotlib.pyplot as plt
+
         # Create figure and axes
         fig, ax = plt.subplots(figsize=(12.8, 9.6))
 
-        # Get drawing data
-        drawing_data, min_compute_util, max_compute_util = self.get_drawing_data(bw_util_scaling)
-
-        # Render the kernels
-        self.render_drawing_data(ax, drawing_data)
+        min_compute_util, max_compute_util, time_range = self._render(ax,
+                                                                      bw_util_scaling,
+                                                                      batch,
+                                                                      lod,
+                                                                      resolution,
+                                                                      verbose=True)
 
         if title is None:
             title = f"Campaign Diagram: {self.cascade.name}"
 
         # Final formatting and display of the plot
-        self.format_plot(ax, min_compute_util, max_compute_util, title, bw_util_scaling)
+        self.format_plot(ax, min_compute_util, max_compute_util, title, bw_util_scaling,
+                         time_range=time_range)
 
         return self
 
-    def get_drawing_data(self, bw_util_scaling):
+    def render(self, title=None, bw_util_scaling=0.25, batch=True, figsize=(12.8, 9.6),
+               lod=False, resolution=None):
+        """Render the campaign diagram into a new headless figure
+
+        The figure draws on an Agg canvas and is not managed by pyplot,
+        so nothing is displayed and the figure is freed as soon as it
+        is no longer referenced. Nothing is printed either, see
+        summary() for the statistics and overflows. See draw() for lod
+        and resolution.
+
+        Returns the matplotlib Figure.
+
+        """
+
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+
+        min_compute_util, max_compute_util, time_range = self._render(ax,
+                                                                      bw_util_scaling,
+                                                                      batch,
+                                                                      lod,
+                                                                      resolution,
+                                                                      verbose=False)
+
+        if title is None:
+            title = f"Campaign Diagram: {self.cascade.name}"
+
+        self.format_axes(ax, min_compute_util, max_compute_util, title, bw_util_scaling,
+                         time_range=time_range)
+
+        return fig
+
+    def _render(self, ax, bw_util_scaling, batch, lod, resolution, verbose):
+        """Render the kernels (or bands) on ax
+
+        Returns the (min, max) compute utilization and (start, end)
+        time to show.
+
+        """
+
+        if lod:
+            # One band per pixel (of the figure width) by default
+            if resolution is None:
+                bands = self.drawing_bands(bands=int(ax.figure.get_figwidth() * ax.figure.dpi))
+            else:
+                bands = self.drawing_bands(resolution=resolution)
+
+            self.render_bands(ax, bands, bw_util_scaling)
+
+            return (*bands.util_range(bw_util_scaling), (bands.edges[0], bands.edges[-1]))
+
+        # Get drawing data
+        data = self.drawing_data()
+
+        if verbose:
+            for time, resource, util in self.overflows:
+                if resource == "compute":
+                    print(f"{time:.2f}: Compute Overflow ({util:.2f})")
+                else:
+                    print(f"{time:.2f}: Bandwidth overflow ({util:.2f})")
+
+        # Render the kernels
+        self.render_data(ax, data, bw_util_scaling, batch=batch)
+
+        return (*data.util_range(bw_util_scaling), (data.start_min, data.end_max))
+
+    def save(self, file, format=None, dpi=None, **kwargs):
+        """Save the campaign diagram to a file without displaying it
+
+        The file can be a path or a file-like object (such as an
+        io.BytesIO). The format is "png", "svg" or "pdf", and by
+        default it comes from the extension of the path (or is "png"
+        for a file-like object). The other arguments are passed to
+        render().
+
+        Returns the summary() of the diagram.
+
+        """
+
+        if format is None and not isinstance(file, (str, os.PathLike)):
+            format = "png"
+
+        fig = self.render(**kwargs)
+
+        try:
+            fig.savefig(file, format=format, dpi=dpi)
+        finally:
+            fig.clear()
+
+        return self.summary()
+
+    def summary(self):
+        """Return the summary statistics of the diagram
+
+        Returns a dictionary with the name, duration, average and peak
+        utilizations and time over capacity of the cascade (see
+        Cascade.stats()), and the overflows found when the diagram was
+        last drawn as a list of (time, resource, utilization) tuples,
+        where resource is "compute" or "bw".
+
+        """
+
+        return diagram_summary(self.cascade, self.overflows)
+
+    def drawing_data(self):
+        """Return the DrawingData of the cascade
+
+        The drawing data is cached by the cascade (see
+        Cascade.drawing_data()), and its overflows become the
+        overflows of the diagram.
+
+        """
+
+        data = self.cascade.drawing_data()
+
+        self.overflows = list(data.overflows)
+
+        return data
+
+    def drawing_bands(self, resolution=None, bands=None):
+        """Return the DrawingBands of the cascade
+
+        The bands are resolution wide, or there are the given number
+        of bands. The overflows of the diagram are not updated, since
+        the bands do not stack the kernels.
+
+        """
+
+        return DrawingBands.fromIntervals(self.cascade.intervals, resolution=resolution, bands=bands)
+
+    def render_bands(self, ax, bands, bw_util_scaling):
+        """Render DrawingBands on ax
+
+        The average compute utilization of each band is drawn as a
+        line, with the range of compute utilization in the band behind
+        it, and the peak, average and minimum bw utilization as
+        nested rectangles (darker towards the minimum) centered on the
+        line and scaled by bw_util_scaling, as for the kernels. The
+        number of artists is fixed and their size depends only on the
+        number of bands.
+
+        """
+
+        edges = bands.edges
+
+        # Repeat the last value to draw steps up to the last edge
+        def steps(values):
+            return np.append(values, values[-1:])
+
+        compute_avg = steps(bands.compute_avg)
+
+        for bw_util, alpha, label in ((bands.bw_max, 0.2, "Peak bw"),
+                                      (bands.bw_avg, 0.4, "Average bw"),
+                                      (bands.bw_min, 0.6, "Minimum bw")):
+            height = bw_util_scaling * steps(bw_util)
+
+            ax.fill_between(edges,
+                            compute_avg - height / 2,
+                            compute_avg + height / 2,
+                            step='post',
+                            color=LOD_BW_COLOR,
+                            alpha=alpha,
+                            linewidth=0,
+                            label=label)
+
+        ax.fill_between(edges,
+                        steps(bands.compute_min),
+                        steps(bands.compute_max),
+                        step='post',
+                        color='lightgray',
+                        alpha=0.5,
+                        linewidth=0,
+                        label="Compute range")
+
+        ax.step(edges,
+                compute_avg,
+                where='post',
+                color=LOD_COMPUTE_COLOR,
+                lw=1,
+                label="Average compute")
+
+    def render_data(self, ax, data, bw_util_scaling, batch=False):
+        """Render DrawingData on ax
+
+        With batch=True the lines are added to ax as one
+        LineCollection per kernel name, color and linestyle and the
+        rectangles as one PolyCollection per type of rectangle, built
+        directly from the arrays of the drawing data. Otherwise each
+        segment is drawn with its own artists (see LineDrawingInfo and
+        RectangleDrawingInfo).
+
+        """
+
+        import matplotlib.colors as mcolors
+
+        compute_colors, bw_colors = data.colors(self.colors)
+        cropped_names = data.cropped_names()
+
+        memory_bottom, memory_height, bw_bottom, bw_height = data.rectangles(bw_util_scaling)
+
+        if batch:
+            collections = DrawingCollections()
+            collections.add_data(data, compute_colors, cropped_names)
+            collections.render(ax)
+
+            left = data.start
+            right = data.start + data.width
+
+            ax.add_collection(_rectangles(left, right, memory_bottom, memory_height,
+                                          mcolors.to_rgba_array(bw_colors)[data.name_ids],
+                                          alpha=0.5))
+            ax.add_collection(_rectangles(left, right, bw_bottom, bw_height,
+                                          'lightgray',
+                                          alpha=0.3))
+            return
+
+        columns = zip(data.name_ids.tolist(),
+                      data.labels,
+                      data.start.tolist(),
+                      data.end.tolist(),
+                      data.util.tolist(),
+                      data.throttled_duration.tolist(),
+                      data.width.tolist(),
+                      data.next_util.tolist(),
+                      memory_bottom.tolist(),
+                      memory_height.tolist(),
+                      bw_bottom.tolist(),
+                      bw_height.tolist())
+
+        for (name_id, label, start, end, util, throttled_duration, width, next_util,
+             memory_bottom, memory_height, bw_bottom, bw_height) in columns:
+
+            compute_line = LineDrawingInfo(start=start,
+                                           end=end,
+                                           util=util,
+                                           color=compute_colors[name_id],
+                                           label=label,
+                                           throttled_duration=throttled_duration)
+
+            # Draw line connecting to the next (different height) segment
+            if next_util == next_util:
+                compute_line.draw_v_to(ax, next_util)
+
+            # Draw the compute line
+            compute_line.draw(ax)
+
+            # Draw the memory rectangle
+            RectangleDrawingInfo(start=start,
+                                 bottom=memory_bottom,
+                                 width=width,
+                                 height=memory_height,
+                                 color=bw_colors[name_id],
+                                 alpha=0.5).draw(ax)
+
+            # Draw the bandwidth rectangle
+            RectangleDrawingInfo(start=start,
+                                 bottom=bw_bottom,
+                                 width=width,
+                                 height=bw_height,
+                                 color='lightgray',
+                                 alpha=0.3).draw(ax)
+
+    def get_drawing_data(self, bw_util_scaling, verbose=True):
+        """Create the drawing info of each kernel one by one
+
+        This is the original (per kernel object) version of
+        drawing_data(), which draw() and render() no longer use.
+
+        """
+
         labels = {}
+        self.overflows = []
         current_parallel_start = None
         min_compute_util = bw_util_scaling  # Hack to set y-min at 0
         max_compute_util = 1.0
@@ -69,7 +377,9 @@ class CampaignDiagram:
                 cumulative_compute_util += kernel.compute_util
 
             if cumulative_compute_util > 1.0:
-                print(f"{kernel.start:.2f}: Compute Overflow ({cumulative_compute_util:.2f})")
+                self.overflows.append((kernel.start, "compute", cumulative_compute_util))
+                if verbose:
+                    print(f"{kernel.start:.2f}: Compute Overflow ({cumulative_compute_util:.2f})")
 
             min_compute_util = min(min_compute_util, cumulative_compute_util)
             max_compute_util = max(max_compute_util, cumulative_compute_util)
@@ -79,7 +389,7 @@ class CampaignDiagram:
                 start=current_parallel_start,
                 end=kernel.end,
                 util=cumulative_compute_util,
-                color=kernel.compute_color,
+                color=self.colors[kernel.name][0],
                 label=label,
                 throttled_duration=kernel.throttled_duration
             )
@@ -95,7 +405,7 @@ class CampaignDiagram:
                 bottom=rect_bottom,
                 width=kernel.duration,
                 height=rect_height,
-                color=kernel.bw_color,
+                color=self.colors[kernel.name][1],
                 alpha=0.5
             )
 
@@ -115,7 +425,9 @@ class CampaignDiagram:
 
             cumulative_bw_util += current_bw_util
             if cumulative_bw_util > 1.0:
-                print(f"{kernel.start:.2f}: Bandwidth overflow ({cumulative_bw_util:.2f})")
+                self.overflows.append((kernel.start, "bw", cumulative_bw_util))
+                if verbose:
+                    print(f"{kernel.start:.2f}: Bandwidth overflow ({cumulative_bw_util:.2f})")
                 cumulative_bw_util = 1.0
 
             # Collect all drawing info in KernelDrawingInfo
@@ -129,32 +441,18 @@ class CampaignDiagram:
         return drawing_data, min_compute_util, max_compute_util
 
     def render_drawing_data(self, ax, drawing_data):
-        for n, info in enumerate(drawing_data):
+        """Render the drawing data of get_drawing_data() on ax
 
-            # Deal with splits of an original kernel
-            found_it = False
-
-            # Search for the next piece of a split kernel
-            for m, candidate_info in enumerate(drawing_data[n+1:]):
-                if info.origin == candidate_info.origin:
-                    # Found a continuation of the current kernel
-                    if info.compute_line.util == candidate_info.compute_line.util:
-                        # Same heights - extend width and draw (or extend again) later
-                        info.extend(candidate_info)
-                        drawing_data[n+1+m] = info
-                        found_it = True
-                        break
-                    else:
-                        # Different heights - draw line connecting segments
-                        info.compute_line.draw_v(ax, candidate_info)
-                        break
-                else:
-                    # Stop looking on seeing new instance of same kernel
-                    if info.origin.name == candidate_info.origin.name:
-                        break
+        This is the original version of render_data() (see
+        get_drawing_data()).
+
+        """
 
-            if found_it:
-                continue
+        for info, next_info in self.stitch_drawing_data(drawing_data):
+
+            # Draw line connecting to the next (different height) segment
+            if next_info is not None:
+                info.compute_line.draw_v(ax, next_info)
 
             # Draw the compute line
             info.compute_line.draw(ax)
@@ -165,11 +463,85 @@ class CampaignDiagram:
             # Draw the bandwidth rectangle
             info.bw_rect.draw(ax)
 
+    def stitch_drawing_data(self, drawing_data):
+        """Stitch together the pieces of kernels split into intervals
+
+        Generates the drawing info to draw in order as a tuple
+        (info, next_info), where consecutive pieces of a kernel with
+        the same height have been merged into info, and next_info is
+        the next piece of the kernel if it has a different height (so
+        a vertical line should connect them) or None.
+
+        """
+
+        # The search for the next piece of a kernel stops at the next
+        # drawing info for a kernel with the same name, which is either
+        # the next piece (same origin) or a new instance of the kernel.
+        # So find the index of that drawing info for all drawing info
+        # in a single pass
+        next_same_name = [None] * len(drawing_data)
+        last_same_name = {}
+
+        for n in reversed(range(len(drawing_data))):
+            name = drawing_data[n].origin.name
+            next_same_name[n] = last_same_name.get(name)
+            last_same_name[name] = n
+
+        for n, info in enumerate(drawing_data):
+
+            # Deal with splits of an original kernel
+            next_info = None
+
+            m = next_same_name[n]
+
+            if m is not None and info.origin is drawing_data[m].origin:
+                # Found a continuation of the current kernel
+                candidate_info = drawing_data[m]
+
+                if info.compute_line.util == candidate_info.compute_line.util:
+                    # Same heights - extend width and draw (or extend again) later
+                    info.extend(candidate_info)
+                    drawing_data[m] = info
+                    continue
+
+                # Different heights - connect the segments
+                next_info = candidate_info
+
+            yield info, next_info
+
+    def format_plot(self, ax, min_compute_util, max_compute_util, title, bw_util_scaling,
+                    time_range=None):
+
+        self.format_axes(ax, min_compute_util, max_compute_util, title, bw_util_scaling,
+                         time_range=time_range)
+
+        import matplotlib.pyplot as plt
+
+        # Show the plot
+        plt.show()
+
+        summary = self.summary()
+
+        print(f"Cascade duration: {summary['duration']:.2f}")
+        print(f"Cascade average compute utilization: {summary['avg_compute_util']:.2f}")
+        print(f"Cascade average bw utilization: {summary['avg_bw_util']:.2f}")
+
+    def format_axes(self, ax, min_compute_util, max_compute_util, title, bw_util_scaling,
+                    time_range=None):
+        """Set the title, limits, labels and legend of the diagram
+
+        The time_range is the (start, end) time of the kernels, which
+        by default comes from the drawing data.
+
+        """
 
-    def format_plot(self, ax, min_compute_util, max_compute_util, title, bw_util_scaling):
         # Determine plot boundaries
-        start_min = min([kernel.start for kernel in self.kernels]) - 0.1
-        end_max = max([kernel.end for kernel in self.kernels]) + 0.1
+        if time_range is None:
+            data = self.cascade.drawing_data()
+            time_range = (data.start_min, data.end_max)
+
+        start_min = time_range[0] - 0.1
+        end_max = time_range[1] + 0.1
 
         # Set title, limits, and labels
         ax.set_title(title)
@@ -184,14 +556,7 @@ class CampaignDiagram:
         # Move the legend outside the right side of the plot
         ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
         # Adjust layout to make room for the legend
-        plt.tight_layout(rect=[0, 0, 0.85, 1])
-
-        # Show the plot
-        plt.show()
-
-        print(f"Cascade duration: {self.cascade.duration():.2f}")
-        print(f"Cascade average compute utilization: {self.cascade.avg_compute_util():.2f}")
-        print(f"Cascade average bw utilization: {self.cascade.avg_bw_util():.2f}")
+        ax.figure.tight_layout(rect=[0, 0, 0.85, 1])
 
 
     def __str__(self):
@@ -223,6 +588,78 @@ class KernelDrawingInfo:
         return self
 
 
+class DrawingCollections:
+    """Collects the lines of a campaign diagram
+
+    Rather than adding an artist (or two) per kernel, the collected
+    lines are added to the axes as one LineCollection per kernel name,
+    color and linestyle, so the number of artists depends on the
+    number of kernel names rather than on the number of kernels.
+
+    """
+
+    def __init__(self):
+        # (name, color, linestyle) -> [label, segments]
+        self.lines = {}
+
+    def add_data(self, data, colors, names):
+        """Add the lines of DrawingData
+
+        The colors and names are the compute color and cropped name of
+        each of the names of the drawing data. The rectangles are not
+        added (see CampaignDiagram.render_data()).
+
+        """
+
+        columns = zip(data.name_ids.tolist(),
+                      data.labels,
+                      data.start.tolist(),
+                      data.end.tolist(),
+                      data.util.tolist(),
+                      data.throttled_duration.tolist(),
+                      data.next_util.tolist())
+
+        for name_id, label, start, end, util, throttled_duration, next_util in columns:
+
+            line_key = (names[name_id], colors[name_id])
+
+            # Line connecting to the next (different height) segment
+            if next_util == next_util:
+                self._add_segment(line_key, [(end, util), (end, next_util)], '-', label)
+
+            throttle_point = end - throttled_duration
+
+            self._add_segment(line_key, [(start, util), (throttle_point, util)], '-', label)
+
+            if throttled_duration != 0:
+                self._add_segment(line_key, [(throttle_point, util), (end, util)], ':')
+
+    def _add_segment(self, line_key, segment, linestyle, label=None):
+
+        key = line_key + (linestyle,)
+
+        entry = self.lines.get(key)
+        if entry is None:
+            entry = [label, []]
+            self.lines[key] = entry
+        elif entry[0] is None:
+            entry[0] = label
+
+        entry[1].append(segment)
+
+    def render(self, ax):
+        """ Add the collections to ax """
+
+        from matplotlib.collections import LineCollection
+
+        for (name, color, linestyle), (label, segments) in self.lines.items():
+            ax.add_collection(LineCollection(segments,
+                                             colors=color,
+                                             linestyles=linestyle,
+                                             linewidths=2,
+                                             label=label))
+
+
 class LineDrawingInfo:
     def __init__(self, start, end, util, color, label=None, throttled_duration=0):
         self.start = start
@@ -255,9 +692,13 @@ class LineDrawingInfo:
 
     def draw_v(self, ax, next):
 
+        self.draw_v_to(ax, next.compute_line.util)
+
+    def draw_v_to(self, ax, util):
+
         ax.plot(
             [self.end, self.end],
-            [self.util, next.compute_line.util],
+            [self.util, util],
             color=self.color,
             lw=2,
             label=self.label
@@ -274,6 +715,9 @@ class RectangleDrawingInfo:
         self.alpha = alpha  # Transparency of the rectangle
 
     def draw(self, ax):
+
+        import matplotlib.patches as patches
+
         rect = patches.Rectangle(
             (self.start, self.bottom),
             self.width,
@@ -285,6 +729,27 @@ class RectangleDrawingInfo:
         ax.add_patch(rect)
 
 
+def _rectangles(left, right, bottom, height, color, alpha):
+    """ Create a PolyCollection of the rectangles given as arrays """
+
+    import matplotlib.colors as mcolors
+
+    from matplotlib.collections import PolyCollection
+
+    top = bottom + height
+
+    vertices = np.stack([np.stack([left, bottom], axis=-1),
+                         np.stack([left, top], axis=-1),
+                         np.stack([right, top], axis=-1),
+                         np.stack([right, bottom], axis=-1)],
+                        axis=1)
+
+    colors = mcolors.to_rgba_array(color)
+    colors[:, 3] = alpha
+
+    return PolyCollection(vertices, facecolors=colors, edgecolors=colors)
+
+
 if __name__ == "__main__":
 
     # Example usage with multiple Kernel instances
@@ -1,25 +1,95 @@
+import bisect
+import collections
 import copy
+import functools
+import warnings
 
 from typing import Tuple
 from typing import List
 
-from deprecated import deprecated
-
-from ruamel.yaml import YAML
-
 import logging
 
+import numpy as np
+
 
 from campaign_diagram.kernel import *
 from campaign_diagram.intervals import *
+from campaign_diagram.kernel_store import *
+from campaign_diagram.kernel_reader import *
+from campaign_diagram.cascade_file import *
+from campaign_diagram.scheduler import *
+from campaign_diagram.drawing_data import *
 
 kernel_color_map = KernelColor()
 
+
+def _piece_duration(start, end):
+    """ Duration of a kernel that starts at start and ends exactly at end """
+
+    duration = end - start
+
+    while start + duration < end:
+        duration = float(np.nextafter(duration, np.inf))
+
+    while start + duration > end:
+        duration = float(np.nextafter(duration, -np.inf))
+
+    return duration
+
+
+def _copy_kernel(kernel, copies):
+    """Copy a kernel as copy.deepcopy() would
+
+    The copy has a copy of the kernel's origin (or is its own origin
+    if the kernel is), and copies maps id(kernel) to the copies made
+    so far, so kernels with the same origin still share one.
+
+    """
+
+    new_kernel = copies.get(id(kernel))
+
+    if new_kernel is None:
+        new_kernel = copies[id(kernel)] = copy.copy(kernel)
+
+        if kernel.origin is kernel:
+            new_kernel.origin = new_kernel
+        else:
+            new_kernel.origin = _copy_kernel(kernel.origin, copies)
+
+    return new_kernel
+
+def _deprecated(reason):
+    """Mark a method as deprecated
+
+    Calls warn with the same DeprecationWarning as the decorator of
+    the deprecated package, which (with wrapt) is slow to import.
+
+    """
+
+    def decorator(method):
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            warnings.warn(f"Call to deprecated method {method.__name__}. ({reason})",
+                          category=DeprecationWarning,
+                          stacklevel=2)
+
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 class Cascade:
     """A class to manage a collection of Kernel instances."""
 
     # TODO: add support for  "+"
-    # TODO: add supprot for len()
+
+    # Number of intervals from which throttle() converts the intervals
+    # to a KernelStore and uses its batched throttle (which, including
+    # the conversion, is faster for all but the smallest cascades)
+    store_throttle_intervals = 1000
 
     def __init__(self, kernels: List[Kernel], name="", sequential=False):
 
@@ -28,6 +98,15 @@ class Cascade:
 
         self.name = name
 
+        # Flat list of kernels and the intervals (and version) it came from
+        self._kernels_cache = (None, None, None)
+
+        # DrawingData and the intervals (and version) it came from
+        self._drawing_data_cache = (None, None, None)
+
+        # Colors of the kernels by name (see assign_colors())
+        self.colors = {}
+
         if sequential:
             self.assign_starts(kernels)
 
@@ -38,6 +117,9 @@ class Cascade:
     def fromYAML(cls, yaml_file):
         """ Creat a cascade from a YAML file """
 
+        # ruamel.yaml is slow to import, so only import it when needed
+        from ruamel.yaml import YAML
+
         yaml = YAML()  # Initialize ruamel.yaml parser
         with open(yaml_file, 'r') as file:
             data = yaml.load(file)
@@ -60,6 +142,63 @@ class Cascade:
                    kernels=kernels,
                    sequential=True)
 
+    @classmethod
+    def fromFile(cls, kernel_file, format=None, name=None, store=False):
+        """Create a sequential cascade by streaming a kernel file
+
+        The file can be YAML (like fromYAML()), JSON Lines or CSV, see
+        KernelReader. Kernels are read one at a time, so the parsed
+        file is never held in memory. With store=True the kernels go
+        straight into a KernelStore backed cascade, without creating
+        Kernel objects.
+
+        """
+
+        reader = KernelReader(kernel_file, format=format)
+
+        if store:
+            kernel_store = KernelStore.fromRecords(reader)
+        else:
+            kernels = [Kernel(name=record.get('name'),
+                              duration=record.get('duration'),
+                              compute_util=record.get('compute_util'),
+                              bw_util=record.get('bw_util'))
+                       for record in reader]
+
+        if name is None:
+            name = reader.cascade.get('name', 'Unnamed Cascade')
+
+        if store:
+            return cls.fromStore(kernel_store, name=name, sequential=True)
+
+        return cls(name=name,
+                   kernels=kernels,
+                   sequential=True)
+
+    @classmethod
+    def fromBinary(cls, cascade_file, mmap=True):
+        """Create a cascade from a binary cascade file (see toBinary())
+
+        With mmap=True the file is memory mapped, so kernels are only
+        read when they are used.
+
+        """
+
+        store, name = load_store(cascade_file, mmap=mmap)
+
+        return cls.fromStore(store, name=name)
+
+    def toBinary(self, cascade_file):
+        """Save the cascade to a binary cascade file
+
+        The file holds fixed-width kernel records, the kernel name
+        table, origin ids and the interval boundaries, so the cascade
+        (e.g., after throttling) is reloaded exactly by fromBinary().
+
+        """
+
+        save_store(cascade_file, self.toStore(), name=self.name)
+
     @classmethod
     def fromIntervals(cls, name, intervals):
         """ Create a csacade from an interval data structure """
@@ -69,17 +208,82 @@ class Cascade:
 
         return c
 
+    @classmethod
+    def fromStore(cls, store, name="", sequential=False):
+        """Create a cascade backed by a columnar KernelStore
+
+        Kernel objects are only created when the kernels of the
+        cascade are accessed.
+
+        """
+
+        if sequential:
+            store.assign_starts()
+
+        return cls.fromIntervals(name, Intervals.fromStore(store))
+
+    def toStore(self):
+        """ Return the KernelStore backing the cascade (or a new one) """
+
+        if self.intervals.store is not None:
+            return self.intervals.store
+
+        return KernelStore.fromIntervals(self.intervals)
+
+    @property
+    def intervals(self):
+        """ The Intervals holding the kernels of the cascade """
+
+        return self._intervals
+
+    @intervals.setter
+    def intervals(self, intervals):
+
+        self._intervals = intervals
+        self._kernels_cache = (None, None, None)
+        self._drawing_data_cache = (None, None, None)
+
     @property
     def kernels(self):
-        """ Flatten intevals into a flat list of kernels """
+        """Flatten intevals into a flat list of kernels
 
-        return self.intervals.flatten()
+        The list is cached until the intervals change, so it should
+        not be modified.
 
-    def __len__(self):
+        """
+
+        intervals, version, kernels = self._kernels_cache
 
-        # TODO: Optimize?
+        if intervals is not self.intervals or version != self.intervals.version:
+            kernels = self.intervals.flatten()
+            self._kernels_cache = (self.intervals, self.intervals.version, kernels)
 
-        return len(self.kernels)
+        return kernels
+
+    def drawing_data(self):
+        """Return the DrawingData of the cascade
+
+        The drawing data is cached until the intervals change, and
+        does not depend on the bw_util_scaling of the diagram, so
+        redrawing the cascade does not recompute it.
+
+        """
+
+        intervals, version, data = self._drawing_data_cache
+
+        if intervals is not self.intervals or version != self.intervals.version:
+            if self.intervals.store is not None:
+                data = DrawingData.fromStore(self.intervals.store)
+            else:
+                data = DrawingData.fromKernels(self.kernels)
+
+            self._drawing_data_cache = (self.intervals, self.intervals.version, data)
+
+        return data
+
+    def __len__(self):
+
+        return self.intervals.num_kernels
 
 
     def __iter__(self):
@@ -102,6 +306,31 @@ class Cascade:
 
         return self.intervals.avg_bw_util()
 
+    def stats(self):
+        """ Return aggregate statistics of the cascade (see Intervals.stats()) """
+
+        return self.intervals.stats()
+
+    def interval_at(self, time):
+        """ Return the interval running at time (or None) """
+
+        return self.intervals.interval_at(time)
+
+    def active_kernels(self, time):
+        """ Return the (split) kernels running at time """
+
+        return self.intervals.active_kernels(time)
+
+    def utilization_at(self, time):
+        """ Return the total (compute, bw) utilization at time """
+
+        return self.intervals.utilization_at(time)
+
+    def utilization(self, start, end):
+        """ Return the average (compute, bw) utilization from start to end """
+
+        return self.intervals.utilization(start, end)
+
     def is_sequential(self):
 
         last_end = 0
@@ -128,19 +357,47 @@ class Cascade:
             kernel.set_start(last_end)
             last_end = kernel.end
 
-    def assign_colors(self):
+    def assign_colors(self, color_map=None):
+        """Set the colors of the kernels from color_map
 
-        for kernel in self.kernels:
-            name = kernel.name
-            kernel.set_color(kernel_color_map.getColor(name))
+        The colors are kept by name in the colors of the cascade
+        (name -> (compute color, bw color)), which is returned. They
+        do not change the colors of other cascades or the default
+        colors of the kernels (see Kernel.set_color()). By default the
+        colors come from a color map shared by all cascades, so
+        kernels with the same name get the same color.
+
+        """
+
+        if color_map is None:
+            color_map = kernel_color_map
 
-    @deprecated(reason="Cascade.split() has been replaced by Cascade.tile()")
+        # Set the colors once per name (in the order the names first
+        # appear)
+        store = self.intervals.store
+
+        if store is not None:
+            name_ids, first = np.unique(store.name_ids, return_index=True)
+            names = [store.names[name_id] for name_id in name_ids[np.argsort(first)].tolist()]
+        else:
+            names = dict.fromkeys(kernel.name for kernel in self.kernels)
+
+        for name in names:
+            color = color_map.getColor(name)
+            self.colors[name] = (color, KernelColor.lightenColor(color, amount=0.5))
+
+        return self.colors
+
+    @_deprecated(reason="Cascade.split() has been replaced by Cascade.tile()")
     def split(self, parts):
         return self.tile(parts)
 
     def tile(self, parts):
         """Tile by splitting each task of a cascade into "parts" parts
 
+        Returns a TiledCascade, which only creates the kernels of the
+        tiles when they are used.
+
         Note: This only works for a cascade that is a simple
         sequential series of kernels.
 
@@ -155,15 +412,29 @@ class Cascade:
         for kernel in self.kernels:
             split_kernels.append(kernel.copy().scale_duration(parts_fraction))
 
-        split_cascade = Cascade(name=f"{self.name} (Tiled)",
-                                kernels=[kernel.clone() for kernel in parts*split_kernels],
-                                sequential=True)
+        split_cascade = TiledCascade(name=f"{self.name} (Tiled)",
+                                     kernels=split_kernels,
+                                     parts=parts)
 
         return split_cascade
 
-    def pipeline(self, stages=2, spread=False):
+    def pipeline(self, stages=2, spread=False, mode="step", budget=32, seed=0):
         """Pipeline a set of tasks
 
+        Tile i runs in stage i % stages, and each stage starts one
+        step after the stage before it, so step r of the pipeline runs
+        tile s + (r-s)*stages of each stage s (if there is one). Steps
+        run one after another and take as long as their longest tile
+        (which the other tiles of the step are dilated to with
+        spread=True). The pipeline ends at the step where the last
+        stage runs out of tiles.
+
+        With mode="list" the tiles are instead placed by a list
+        scheduler that keeps the compute and bw utilization within
+        1.0 (see list_schedule()), trying up to "budget" schedules
+        (the random ones seeded by seed). The list scheduler dilates
+        tiles only as much as needed, so spread cannot be used with it.
+
         Note: Input must be a sequential set of tiles
         Note: This is not meaningful after a cascade is throttled
 
@@ -171,26 +442,40 @@ class Cascade:
 
         assert self.is_sequential()
 
-        tasks = []
+        if mode == "list":
+            if spread:
+                raise ValueError('spread is not supported with mode="list"')
+
+            return self._list_pipeline(stages, budget, seed)
 
-        orig_kernels = copy.deepcopy(self.kernels)
+        if mode != "step":
+            raise ValueError(f"Unknown pipeline mode: {mode}")
 
-        for stage in range(stages):
-            name = orig_kernels[stage].name
-            task = self._create_spacers(stage, name)
-            task.extend(orig_kernels[stage::stages])
-            task.extend(self._create_spacers(stages-stage-1, name))
+        orig_kernels = self.kernels
+        num_kernels = len(orig_kernels)
 
-            tasks.append(task)
+        # Number of steps until the stage with the fewest tiles is done
+        num_steps = stages - 1 + min(len(range(stage, num_kernels, stages))
+                                     for stage in range(stages))
 
         # Start with a default previous_end value of zero
         new_kernels = []
         previous_end = 0
 
-        # Iterate over both lists in tandem
-        for kernels in zip(*tasks):
+        # Copies of the kernels (and their origins)
+        copies = {}
+
+        for step in range(num_steps):
+
+            kernels = []
+
+            for stage in range(min(step + 1, stages)):
+                index = stage + (step - stage) * stages
+
+                if index < num_kernels:
+                    kernels.append(orig_kernels[index])
 
-            max_duration = max([kernel.duration for kernel in kernels])
+            max_duration = max([kernel.duration for kernel in kernels], default=0)
 
             for kernel in kernels:
 
@@ -198,6 +483,7 @@ class Cascade:
                 if kernel.duration == 0:
                     continue
 
+                kernel = _copy_kernel(kernel, copies)
                 kernel.set_start(previous_end)
 
                 if spread:
@@ -206,7 +492,7 @@ class Cascade:
 
                 new_kernels.append(kernel)
 
-            # TODO: Handle resource overutilization
+            # Note: Resources can be overutilized, see mode="list"
 
             previous_end += max_duration
 
@@ -215,26 +501,87 @@ class Cascade:
 
         return t
 
-    def _create_spacers(self, count, name=None):
+    def _list_pipeline(self, stages, budget, seed):
+        """ Pipeline with a resource-aware list schedule """
+
+        orig_kernels = self.kernels
+
+        pieces, _ = list_schedule(orig_kernels, stages=stages, budget=budget, seed=seed)
+
+        num_pieces = collections.Counter(piece[0] for piece in pieces)
+
+        # Every time a piece starts or ends
+        times = sorted({time for piece in pieces for time in piece[1:3]})
+
+        new_kernels = []
+
+        # Copies of the kernels (and their origins)
+        copies = {}
+
+        for index, start, end, dilation in sorted(pieces, key=lambda piece: piece[:2]):
+            kernel = orig_kernels[index]
+
+            # Just skip kernels with duration == 0
+            if kernel.duration == 0:
+                continue
+
+            new_kernel = _copy_kernel(kernel, copies)
+
+            # Split the piece at the times other pieces start or end,
+            # since splitting it when grouping the kernels into
+            # intervals can make the parts overlap by an ulp
+            bounds = [start] + times[bisect.bisect_right(times, start):bisect.bisect_left(times, end)] + [end]
+
+            for part_start, part_end in zip(bounds, bounds[1:]):
+
+                # Parts of a kernel share its origin (and, as with
+                # Kernel.split(), drop throttled_duration)
+                if num_pieces[index] > 1 or len(bounds) > 2:
+                    new_kernel = Kernel(name=kernel.name,
+                                        duration=(part_end - part_start) / dilation,
+                                        compute_util=kernel.compute_util,
+                                        bw_util=kernel.bw_util,
+                                        origin=new_kernel.origin,
+                                        bw_util_limit=kernel.bw_util_limit)
 
-        spacer = Kernel(name=name,
-                        duration=0,
-                        compute_util=0,
-                        bw_util=0)
+                new_kernel.set_start(part_start)
 
-        spacers =  [copy.copy(spacer) for _ in range(count)]
+                if dilation != 1.0:
+                    new_kernel.dilate(dilation)
 
-        return spacers
+                # End exactly where the schedule does (part_end -
+                # part_start can be an ulp off), so parts that meet do
+                # not overlap
+                new_kernel.duration = _piece_duration(part_start, part_end)
+
+                new_kernels.append(new_kernel)
+
+        return Cascade(name=f"{self.name} (Pipelined)",
+                       kernels=new_kernels)
 
     def throttle(self):
-        """Throttle a cascde to keep within resource constraints."""
+        """Throttle a cascde to keep within resource constraints.
+
+        Large cascades (see store_throttle_intervals) are throttled
+        as a KernelStore, so the throttled cascade is backed by a
+        store, and the origins of its kernels are new kernels rather
+        than those of this cascade. Otherwise the throttled cascade
+        shares the intervals that are not changed by throttling with
+        this cascade (see Intervals.throttled()).
+
+        """
 
         self.logger.debug("Starting throttle")
 
-        new_intervals = copy.deepcopy(self.intervals)
+        intervals = self.intervals
 
-        # Throttle the kernels in place
-        new_intervals.throttle()
+        if intervals.store is None and len(intervals) >= self.store_throttle_intervals:
+            # The store is new, so it can be throttled in place
+            store = KernelStore.fromIntervals(intervals).throttle()
+            new_intervals = Intervals.fromStore(store)
+        else:
+            # Throttled intervals share unchanged intervals with self
+            new_intervals = intervals.throttled()
 
         return Cascade.fromIntervals(name=f"{self.name} (Throttled)",
                                      intervals=new_intervals)
@@ -255,3 +602,158 @@ class Cascade:
 
         kernel_states = "\n".join([str(kernel) for kernel in self.kernels])
         return f"Cascade: {self.name} with kernels:\n{kernel_states}"
+
+
+class TiledCascade(Cascade):
+    """A sequential cascade of "parts" repeats of a list of kernels
+
+    This is the result of Cascade.tile(). Only the kernels of one
+    repeat and the number of repeats are kept. The duration and
+    average utilizations are computed in closed form from one repeat
+    (so they can differ in rounding from summing over all the
+    kernels), and the kernels are only created when the cascade is
+    iterated, and its intervals only when they are used (e.g., by
+    throttle()).
+
+    Until the intervals are created, kernels (and iterating the
+    cascade) gives the list of tiled kernels (each its own origin),
+    which is created once and gives the origins of the kernels of
+    the intervals.
+
+    """
+
+    def __init__(self, kernels, parts, name=""):
+
+        super().__init__(kernels=[], name=name)
+
+        self.base_kernels = kernels
+        self.parts = parts
+
+        # The intervals are created on demand (see intervals)
+        self._intervals = None
+
+        # The tiled kernels, created once (see kernels)
+        self._tiled_kernels = None
+        self._base_stats = None
+
+        # The intervals created from the tiled kernels and their version
+        self._tiled_intervals = (None, None)
+
+    @classmethod
+    def fromIntervals(cls, name, intervals):
+        """ Create a (plain) Cascade from intervals, see Cascade.fromIntervals() """
+
+        return Cascade.fromIntervals(name, intervals)
+
+    @classmethod
+    def fromYAML(cls, yaml_file):
+        """ Create a (plain) Cascade from a YAML file, see Cascade.fromYAML() """
+
+        return Cascade.fromYAML(yaml_file)
+
+    @classmethod
+    def fromFile(cls, kernel_file, format=None, name=None, store=False):
+        """ Create a (plain) Cascade from a kernel file, see Cascade.fromFile() """
+
+        return Cascade.fromFile(kernel_file, format=format, name=name, store=store)
+
+    @property
+    def intervals(self):
+        """ The Intervals holding the kernels of the cascade (created on demand) """
+
+        if self._intervals is None:
+            kernels = self._tiled_kernels
+
+            if kernels is None:
+                kernels = list(self._generate_kernels())
+
+            self.intervals = Intervals(kernels)
+            self._tiled_kernels = None
+            self._tiled_intervals = (self._intervals, self._intervals.version)
+
+        return self._intervals
+
+    @intervals.setter
+    def intervals(self, intervals):
+
+        Cascade.intervals.fset(self, intervals)
+
+    @property
+    def kernels(self):
+        """ The tiled kernels, or the flattened intervals once they exist """
+
+        if self._intervals is not None:
+            return Cascade.kernels.fget(self)
+
+        if self._tiled_kernels is None:
+            self._tiled_kernels = list(self._generate_kernels())
+
+        return self._tiled_kernels
+
+    def _generate_kernels(self):
+        """ Generate the tiled kernels with sequential start times """
+
+        last_end = 0
+
+        for _ in range(self.parts):
+            for kernel in self.base_kernels:
+                kernel = kernel.clone().set_start(last_end)
+                last_end = kernel.end
+
+                yield kernel
+
+    def __len__(self):
+
+        if self._intervals is None:
+            return self.parts * len(self.base_kernels)
+
+        return super().__len__()
+
+    def stats(self):
+        """Return aggregate statistics of the cascade (see Intervals.stats())
+
+        Until the intervals are changed, these are the statistics of
+        one repeat with the totals multiplied by the number of repeats.
+
+        """
+
+        intervals, version = self._tiled_intervals
+
+        if self._intervals is not None and (self._intervals is not intervals or
+                                            self._intervals.version != version):
+            return super().stats()
+
+        if self._base_stats is None:
+            base = Cascade(kernels=[kernel.copy() for kernel in self.base_kernels],
+                           sequential=True)
+
+            stats = dict(base.stats())
+
+            for key in ("duration", "compute_util_time", "bw_util_time", "time_over_capacity"):
+                stats[key] *= self.parts
+
+            stats["names"] = {name: {key: total * self.parts for key, total in totals.items()}
+                              for name, totals in stats["names"].items()}
+
+            self._base_stats = stats
+
+        return self._base_stats
+
+    def duration(self):
+        """ Find duration of cascade """
+
+        return self.stats()["duration"]
+
+    def avg_compute_util(self):
+        """ Return average compute util """
+
+        stats = self.stats()
+
+        return stats["compute_util_time"]/stats["duration"]
+
+    def avg_bw_util(self):
+        """ Return average  bw util """
+
+        stats = self.stats()
+
+        return stats["bw_util_time"]/stats["duration"]
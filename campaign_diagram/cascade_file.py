@@ -0,0 +1,146 @@
+import json
+import struct
+
+import numpy as np
+
+from campaign_diagram.kernel_store import *
+
+#
+# Binary cascade file format (all little-endian):
+#
+#   header   - see _header below
+#   metadata - UTF-8 JSON object with the cascade "name" and the
+#              kernel name table ("names")
+#   records  - one fixed-width record per kernel (see record_dtype)
+#   offsets  - int64 interval boundaries (if the kernels are grouped
+#              into intervals), see KernelStore
+#
+# The records and offsets are 64-byte aligned, so they can be memory
+# mapped.
+#
+
+MAGIC = b"CDCASCDE"
+VERSION = 1
+
+# Flags
+HAS_OFFSETS = 0x1
+
+_header = struct.Struct("<8sIIQQQQQQ")
+
+record_dtype = np.dtype([("start", "<f8"),
+                         ("duration", "<f8"),
+                         ("compute_util", "<f8"),
+                         ("bw_util", "<f8"),
+                         ("bw_util_limit", "<f8"),
+                         ("throttled_duration", "<f8"),
+                         ("origin_id", "<i8"),
+                         ("name_id", "<i4"),
+                         ("unused", "<i4")])
+
+_alignment = 64
+
+
+def save_store(path, store, name=""):
+    """ Save a KernelStore (and the name of its cascade) to a binary file """
+
+    metadata = json.dumps({"name": name, "names": store.names}).encode("utf-8")
+
+    metadata_offset = _header.size
+    records_offset = _aligned(metadata_offset + len(metadata))
+    offsets_offset = _aligned(records_offset + len(store) * record_dtype.itemsize)
+
+    flags = 0
+    num_intervals = 0
+
+    if store.offsets is not None:
+        flags |= HAS_OFFSETS
+        num_intervals = store.num_intervals
+
+    records = np.zeros(len(store), dtype=record_dtype)
+
+    for attribute in KernelStore.columns:
+        records[attribute] = getattr(store, attribute)
+
+    records["origin_id"] = store.origin_ids
+    records["name_id"] = store.name_ids
+
+    with open(path, "wb") as file:
+        file.write(_header.pack(MAGIC,
+                                VERSION,
+                                flags,
+                                len(store),
+                                num_intervals,
+                                metadata_offset,
+                                len(metadata),
+                                records_offset,
+                                offsets_offset))
+        file.write(metadata)
+
+        file.write(bytes(records_offset - file.tell()))
+        file.write(records.tobytes())
+
+        if store.offsets is not None:
+            file.write(bytes(offsets_offset - file.tell()))
+            file.write(store.offsets.astype("<i8").tobytes())
+
+
+def load_store(path, mmap=True):
+    """Load a KernelStore from a binary file
+
+    With mmap=True the kernel records and interval offsets are memory
+    mapped (copy-on-write), so they are only read from the file when
+    they are used.
+
+    Returns a tuple (store, cascade name).
+
+    """
+
+    with open(path, "rb") as file:
+        (magic,
+         version,
+         flags,
+         num_kernels,
+         num_intervals,
+         metadata_offset,
+         metadata_size,
+         records_offset,
+         offsets_offset) = _header.unpack(file.read(_header.size))
+
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a cascade file")
+
+        if version != VERSION:
+            raise ValueError(f"Unsupported cascade file version: {version}")
+
+        file.seek(metadata_offset)
+        metadata = json.loads(file.read(metadata_size).decode("utf-8"))
+
+    records = _read_array(path, record_dtype, records_offset, num_kernels, mmap)
+
+    offsets = None
+    if flags & HAS_OFFSETS:
+        offsets = _read_array(path, np.dtype("<i8"), offsets_offset, num_intervals+1, mmap)
+
+    store = KernelStore(metadata["names"],
+                        records["name_id"],
+                        *[records[attribute] for attribute in KernelStore.columns],
+                        origin_ids=records["origin_id"],
+                        offsets=offsets)
+
+    return store, metadata["name"]
+
+
+def _read_array(path, dtype, offset, count, mmap):
+
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=(count,))
+
+    return np.fromfile(path, dtype=dtype, count=count, offset=offset)
+
+
+def _aligned(position):
+
+    return -(-position // _alignment) * _alignment
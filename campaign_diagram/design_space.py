@@ -0,0 +1,82 @@
+import itertools
+
+from campaign_diagram.cascade import *
+
+
+def sweep_design_space(cascade, parts, stages, spread=(False,), throttle=(False, True),
+                       mode="step", processes=None):
+    """Evaluate the pipelines of a cascade over a grid of parameters
+
+    For every combination of the values in parts, stages, spread and
+    throttle (each an iterable of values) the cascade is tiled into
+    "parts" parts, pipelined with "stages" stages (and spread and
+    mode, see Cascade.pipeline()) and throttled if throttle is True,
+    and the statistics of the result are collected. Nothing is drawn.
+
+    The grid is split into one job per parts value, so each job tiles
+    the cascade once and pipelines the tiled cascade once for each
+    stages and spread value, which is shared by the throttled and
+    unthrottled results. The jobs run across a pool of "processes"
+    worker processes (by default one per CPU, and with processes=1
+    they run in this process).
+
+    Returns a list with a dictionary for each combination (in the
+    order of the grid) with the parameters ("parts", "stages",
+    "spread" and "throttle"), the "duration" (makespan), average and
+    peak utilizations and time over capacity of the result (see
+    Cascade.stats()).
+
+    """
+
+    stages = list(stages)
+    spread = list(spread)
+    throttle = list(throttle)
+
+    jobs = [(cascade, value, stages, spread, throttle, mode) for value in parts]
+
+    if processes == 1:
+        results = [_sweep_job(job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_sweep_job, jobs))
+
+    return list(itertools.chain.from_iterable(results))
+
+
+def _sweep_job(job):
+    """ Evaluate the grid for one parts value (in a worker process) """
+
+    cascade, parts, stages, spread, throttle, mode = job
+
+    tiled = cascade.tile(parts)
+
+    rows = []
+
+    for stages_value, spread_value in itertools.product(stages, spread):
+        pipelined = tiled.pipeline(stages=stages_value, spread=spread_value, mode=mode)
+
+        for throttle_value in throttle:
+            result = pipelined.throttle() if throttle_value else pipelined
+
+            rows.append(dict(parts=parts,
+                             stages=stages_value,
+                             spread=spread_value,
+                             throttle=throttle_value,
+                             **_statistics(result)))
+
+    return rows
+
+
+def _statistics(cascade):
+    """ Makespan and utilization statistics of a cascade """
+
+    stats = cascade.stats()
+
+    return {"duration": cascade.duration(),
+            "avg_compute_util": cascade.avg_compute_util(),
+            "avg_bw_util": cascade.avg_bw_util(),
+            "peak_compute_util": stats["peak_compute_util"],
+            "peak_bw_util": stats["peak_bw_util"],
+            "time_over_capacity": stats["time_over_capacity"]}
@@ -0,0 +1,537 @@
+import numpy as np
+
+from campaign_diagram.kernel import *
+
+
+class DrawingData:
+    """The geometry of a campaign diagram as arrays
+
+    The kernels are ordered for drawing (by start time, then by
+    decreasing bw utilization, compute utilization and name), and
+    stacked: within each group of kernels that start at the same time
+    the compute line of a kernel is drawn at the cumulative compute
+    utilization of the group, with its bw rectangle centered on the
+    line and a rectangle for the bw still available (1.0 less the
+    cumulative bw utilization of the kernels before it) behind it.
+
+    Consecutive pieces of a split kernel (same origin) at the same
+    height are stitched into one segment, and a segment followed by a
+    piece of the kernel at a different height is connected to it by a
+    vertical line. There is one entry per segment (in drawing order)
+    in each of the arrays:
+
+      - start, end - of the compute line
+      - util - height (cumulative compute utilization) of the line
+      - throttled_duration - part of the line that is drawn dotted
+      - width - of the rectangles
+      - bw_util, bw_available - unscaled heights of the rectangles
+      - next_util - height of the connected piece (or NaN)
+      - name_ids - into names (the kernel names)
+
+    and labels is a list with the label of each segment (the cropped
+    kernel name for the first segment of each cropped name, else None).
+
+    Nothing depends on bw_util_scaling, which only scales the heights
+    of the rectangles (see rectangles()), so the same drawing data can
+    be used for any scaling and by any backend. Colors are looked up
+    by name when they are needed (see colors()).
+
+    """
+
+    def __init__(self, names, name_ids, start, end, util, throttled_duration, width,
+                 bw_util, bw_available, next_util, labels,
+                 min_util, max_util, start_min, end_max, overflows):
+
+        self.names = names
+        self.name_ids = name_ids
+        self.start = start
+        self.end = end
+        self.util = util
+        self.throttled_duration = throttled_duration
+        self.width = width
+        self.bw_util = bw_util
+        self.bw_available = bw_available
+        self.next_util = next_util
+        self.labels = labels
+
+        # Range of the cumulative compute utilization (of the kernels)
+        self.min_util = min_util
+        self.max_util = max_util
+
+        # Range of the kernels in time
+        self.start_min = start_min
+        self.end_max = end_max
+
+        # List of (time, resource, utilization) tuples, where resource
+        # is "compute" or "bw"
+        self.overflows = overflows
+
+    @classmethod
+    def fromKernels(cls, kernels):
+        """ Create the drawing data for a list of kernels """
+
+        name2id = {}
+        origin2id = {}
+
+        names = []
+
+        def name_id(name):
+            id = name2id.get(name)
+            if id is None:
+                id = name2id[name] = len(names)
+                names.append(name)
+            return id
+
+        name_ids = np.fromiter((name_id(kernel.name) for kernel in kernels),
+                               dtype=np.int64, count=len(kernels))
+
+        # Split kernels are stitched with their origin
+        origin_ids = np.fromiter((origin2id.setdefault(id(kernel.origin), len(origin2id))
+                                  for kernel in kernels),
+                                 dtype=np.int64, count=len(kernels))
+
+        origin_name_ids = np.fromiter((name_id(kernel.origin.name) for kernel in kernels),
+                                      dtype=np.int64, count=len(kernels))
+
+        columns = [np.fromiter((getattr(kernel, attribute) for kernel in kernels),
+                               dtype=np.float64, count=len(kernels))
+                   for attribute in ("start",
+                                     "duration",
+                                     "compute_util",
+                                     "bw_util",
+                                     "throttled_duration")]
+
+        return cls._fromColumns(names, name_ids, origin_ids, origin_name_ids, *columns)
+
+    @classmethod
+    def fromStore(cls, store):
+        """ Create the drawing data for the kernels of a KernelStore """
+
+        name_ids = store.name_ids.astype(np.int64)
+
+        # The origin of a split kernel is named after its first piece
+        _, first, inverse = np.unique(store.origin_ids, return_index=True, return_inverse=True)
+
+        return cls._fromColumns(store.names,
+                                name_ids,
+                                store.origin_ids,
+                                name_ids[first][inverse.ravel()],
+                                store.start,
+                                store.duration,
+                                store.compute_util,
+                                store.bw_util,
+                                store.throttled_duration)
+
+    @classmethod
+    def _fromColumns(cls, names, name_ids, origin_ids, origin_name_ids,
+                     start, duration, compute_util, bw_util, throttled_duration):
+
+        names = list(names)
+
+        # Drawing order: (start, -bw_util, compute_util, name)
+        name_ranks = np.argsort(np.argsort(np.array(names, dtype=object), kind="stable"))
+
+        order = np.lexsort((name_ranks[name_ids] if len(names) else name_ids,
+                            compute_util,
+                            -bw_util,
+                            start))
+
+        name_ids = name_ids[order]
+        origin_ids = origin_ids[order]
+        origin_name_ids = origin_name_ids[order]
+        start = start[order]
+        duration = duration[order]
+        compute_util = compute_util[order]
+        bw_util = bw_util[order]
+        throttled_duration = throttled_duration[order]
+
+        end = start + duration
+        count = len(start)
+
+        # Groups of kernels that start at the same time
+        new_group = np.ones(count, dtype=bool)
+        new_group[1:] = start[1:] != start[:-1]
+        offsets = np.append(np.flatnonzero(new_group), count)
+
+        # Stack the kernels of each group (accumulating left to right),
+        # capping the cumulative bw utilization when it overflows
+        util = np.empty(count)
+        bw_before = np.empty(count)
+        bw_total = np.empty(count)
+
+        for n, rows in _positions(offsets):
+            if n == 0:
+                util[rows] = compute_util[rows]
+                bw_before[rows] = 0
+            else:
+                util[rows] = util[rows-1] + compute_util[rows]
+                bw_before[rows] = np.minimum(bw_total[rows-1], 1.0)
+
+            bw_total[rows] = bw_before[rows] + bw_util[rows]
+
+        overflows = _overflows(start, util, bw_total)
+
+        bw_available = 1.0 - bw_before
+
+        # Label the first kernel with each cropped name
+        cropped_names = [name.split('.')[0] for name in names]
+        cropped2id = {}
+        cropped_ids = np.array([cropped2id.setdefault(cropped, len(cropped2id))
+                                for cropped in cropped_names], dtype=np.int64)
+
+        label_rows = np.zeros(count, dtype=bool)
+        if count:
+            _, first = np.unique(cropped_ids[name_ids], return_index=True)
+            label_rows[first] = True
+
+        # Find the next piece of each kernel. As in stitching the
+        # drawing info one by one, the search stops at the next kernel
+        # with the same name
+        by_name = np.argsort(origin_name_ids, kind="stable")
+        next_row = np.full(count, -1, dtype=np.int64)
+        same_name = origin_name_ids[by_name[1:]] == origin_name_ids[by_name[:-1]]
+        next_row[by_name[:-1][same_name]] = by_name[1:][same_name]
+
+        has_next = next_row >= 0
+        has_next[has_next] = origin_ids[has_next] == origin_ids[next_row[has_next]]
+
+        # Pieces at the same height are merged into a segment
+        merge = has_next.copy()
+        merge[merge] = util[merge] == util[next_row[merge]]
+
+        # First piece of the segment of each piece
+        head = np.arange(count)
+        head[next_row[merge]] = np.flatnonzero(merge)
+
+        while True:
+            new_head = head[head]
+            if np.array_equal(new_head, head):
+                break
+            head = new_head
+
+        # Pieces follow each other in a segment, so grouping the pieces
+        # by head keeps them in order
+        pieces = np.argsort(head, kind="stable")
+        segment_heads = np.flatnonzero(head == np.arange(count))
+        segment_offsets = np.append(np.searchsorted(head[pieces], segment_heads), count)
+
+        piece_segments = np.repeat(np.arange(len(segment_heads)), np.diff(segment_offsets))
+
+        segment_end = np.empty(len(segment_heads))
+        segment_width = np.empty(len(segment_heads))
+        segment_throttled = np.empty(len(segment_heads))
+        last = np.empty(len(segment_heads), dtype=np.int64)
+
+        for n, positions in _positions(segment_offsets):
+            rows = pieces[positions]
+            segments = piece_segments[positions]
+
+            if n == 0:
+                segment_end[segments] = end[rows]
+                segment_width[segments] = duration[rows]
+                segment_throttled[segments] = throttled_duration[rows]
+            else:
+                segment_end[segments] += duration[rows]
+                segment_width[segments] += duration[rows]
+                segment_throttled[segments] += throttled_duration[rows]
+
+            last[segments] = rows
+
+        # Segments are drawn in the order of their last piece
+        drawn = np.argsort(last, kind="stable")
+        heads = segment_heads[drawn]
+        last = last[drawn]
+
+        next_util = np.full(len(heads), np.nan)
+        connected = has_next[last]
+        next_util[connected] = util[next_row[last[connected]]]
+
+        labels = [cropped_names[name_id] if labeled else None
+                  for name_id, labeled in zip(name_ids[heads].tolist(),
+                                              label_rows[heads].tolist())]
+
+        return cls(names,
+                   name_ids[heads],
+                   start[heads],
+                   segment_end[drawn],
+                   util[heads],
+                   segment_throttled[drawn],
+                   segment_width[drawn],
+                   bw_util[heads],
+                   bw_available[heads],
+                   next_util,
+                   labels,
+                   float(util.min(initial=np.inf)),
+                   float(util.max(initial=-np.inf)),
+                   float(start.min(initial=np.inf)),
+                   float(end.max(initial=-np.inf)),
+                   overflows)
+
+    def __len__(self):
+
+        return len(self.start)
+
+    def util_range(self, bw_util_scaling):
+        """ Return the (min, max) compute utilization for the y axis """
+
+        # Hack to set y-min at 0
+        return min(bw_util_scaling, self.min_util), max(1.0, self.max_util)
+
+    def rectangles(self, bw_util_scaling):
+        """Return the rectangles scaled by bw_util_scaling
+
+        Returns a tuple of arrays (memory_bottom, memory_height,
+        bw_bottom, bw_height) with the bottom and height of the bw
+        utilization and available bw rectangles of each segment. The
+        rectangles start at start and are width wide.
+
+        """
+
+        memory_height = bw_util_scaling * self.bw_util
+        memory_bottom = self.util - memory_height / 2
+
+        bw_height = bw_util_scaling * self.bw_available
+        bw_bottom = self.util - bw_height / 2
+
+        return memory_bottom, memory_height, bw_bottom, bw_height
+
+    def colors(self, name_colors=None):
+        """Return the (compute colors, bw colors) of each name
+
+        The colors come from name_colors (name -> (compute color, bw
+        color), e.g., the colors of a cascade), or by default from
+        Kernel.name_colors().
+
+        """
+
+        if name_colors is None:
+            colors = [Kernel.name_colors(name) for name in self.names]
+        else:
+            colors = [name_colors.get(name, (None, None)) for name in self.names]
+
+        return [color[0] for color in colors], [color[1] for color in colors]
+
+    def cropped_names(self):
+        """ Return the cropped name (used for labels) of each name """
+
+        return [name.split('.')[0] for name in self.names]
+
+
+def diagram_summary(cascade, overflows):
+    """Return the summary statistics of a diagram of cascade
+
+    Returns a dictionary with the name, duration, average and peak
+    utilizations and time over capacity of the cascade (see
+    Cascade.stats()), and the overflows (a list of (time, resource,
+    utilization) tuples, where resource is "compute" or "bw").
+
+    """
+
+    stats = cascade.stats()
+
+    return {"name": cascade.name,
+            "duration": cascade.duration(),
+            "avg_compute_util": cascade.avg_compute_util(),
+            "avg_bw_util": cascade.avg_bw_util(),
+            "peak_compute_util": stats["peak_compute_util"],
+            "peak_bw_util": stats["peak_bw_util"],
+            "time_over_capacity": stats["time_over_capacity"],
+            "overflows": list(overflows)}
+
+
+# Colors of the level of detail (LOD) bands
+LOD_COMPUTE_COLOR = '#000000'
+LOD_BW_COLOR = '#1F77B4'
+
+# Fraction of the resolution by which the edge of a band can miss the
+# edge of an interval
+EDGE_TOLERANCE = 1e-9
+
+
+class DrawingBands:
+    """A level of detail (LOD) view of a campaign diagram
+
+    Rather than a segment per kernel, time is divided into bands of
+    (at most) resolution wide, and each band holds the total compute
+    and bw utilization of the intervals in it as arrays with one entry
+    per band:
+
+      - compute_avg, bw_avg - time-weighted average utilization
+      - compute_min, bw_min - lowest utilization of any interval in
+        the band (or 0.0 if nothing runs for part of the band)
+      - compute_max, bw_max - highest utilization of any interval in
+        the band
+
+    The bands run from edges[n] to edges[n+1], so the size of the
+    drawing depends on the resolution rather than on the number of
+    kernels (see CampaignDiagram.render(lod=True)).
+
+    """
+
+    def __init__(self, edges, compute_avg, compute_min, compute_max, bw_avg, bw_min, bw_max):
+
+        self.edges = edges
+        self.compute_avg = compute_avg
+        self.compute_min = compute_min
+        self.compute_max = compute_max
+        self.bw_avg = bw_avg
+        self.bw_min = bw_min
+        self.bw_max = bw_max
+
+    @classmethod
+    def fromIntervals(cls, intervals, resolution=None, bands=None):
+        """Create the bands for an Intervals
+
+        Either the resolution (width of the bands) or the number of
+        bands must be given. The totals come from the time index of
+        the intervals (see Intervals.time_index()).
+
+        """
+
+        index = intervals.time_index()
+
+        starts = np.asarray(index.starts, dtype=np.float64)
+        ends = np.asarray(index.ends, dtype=np.float64)
+
+        if len(starts) == 0 or ends[-1] <= starts[0]:
+            raise ValueError("No intervals to draw")
+
+        first, last = float(starts[0]), float(ends[-1])
+
+        if resolution is None:
+            if bands is None:
+                raise ValueError("Either a resolution or a number of bands is needed")
+            resolution = (last - first) / bands
+
+        if resolution <= 0:
+            raise ValueError(f"Resolution must be positive: {resolution}")
+
+        count = max(1, int(np.ceil((last - first) / resolution)))
+
+        edges = first + resolution * np.arange(count)
+        edges = np.append(edges[edges < last], last)
+
+        compute_utils = np.asarray(index.compute_utils, dtype=np.float64)
+        bw_utils = np.asarray(index.bw_utils, dtype=np.float64)
+
+        # Intervals overlapping each band, and whether nothing runs
+        # during some part of it (ignoring the rounding of the edges)
+        lo = np.searchsorted(ends, edges[:-1], side="right")
+        hi = np.searchsorted(starts, edges[1:], side="left")
+
+        empty = lo >= hi
+
+        gaps = np.zeros(len(starts), dtype=np.int64)
+        gaps[1:] = np.cumsum(starts[1:] > ends[:-1])
+
+        tolerance = resolution * EDGE_TOLERANCE
+
+        idle = empty.copy()
+        full = ~empty
+        idle[full] = ((starts[lo[full]] > edges[:-1][full] + tolerance) |
+                      (ends[hi[full]-1] < edges[1:][full] - tolerance) |
+                      (gaps[hi[full]-1] != gaps[lo[full]]))
+
+        columns = []
+
+        for utils in (compute_utils, bw_utils):
+            avg = np.diff(_util_totals(starts, ends, utils, edges)) / np.diff(edges)
+
+            low = _reduce_ranges(np.minimum, utils, lo, hi)
+            high = _reduce_ranges(np.maximum, utils, lo, hi)
+
+            low[idle] = np.minimum(low[idle], 0.0)
+            high[empty] = 0.0
+
+            columns.extend((avg, low, high))
+
+        return cls(edges, *columns)
+
+    def __len__(self):
+
+        return len(self.compute_avg)
+
+    def util_range(self, bw_util_scaling):
+        """ Return the (min, max) compute utilization for the y axis """
+
+        # Hack to set y-min at 0
+        return (min(bw_util_scaling, float(self.compute_min.min())),
+                max(1.0, float(self.compute_max.max())))
+
+
+def _util_totals(starts, ends, utils, times):
+    """ Return utilization * duration of the intervals up to each time """
+
+    totals = np.concatenate(([0.0], np.cumsum((ends - starts) * utils)))
+
+    index = np.searchsorted(starts, times, side="right") - 1
+    before = index < 0
+    index[before] = 0
+
+    elapsed = np.minimum(times, ends[index]) - starts[index]
+    result = totals[index] + elapsed * utils[index]
+    result[before] = 0.0
+
+    return result
+
+
+def _reduce_ranges(ufunc, values, lo, hi):
+    """ Reduce values[lo[n]:hi[n]] with ufunc for each n (0.0 if empty) """
+
+    result = np.zeros(len(lo))
+    ranges = lo < hi
+
+    if ranges.any():
+        # reduceat over (lo, hi) pairs, with a sentinel so hi can be
+        # the end of values
+        padded = np.append(values, 0.0)
+        indices = np.stack([lo[ranges], hi[ranges]], axis=-1).ravel()
+
+        result[ranges] = ufunc.reduceat(padded, indices)[::2]
+
+    return result
+
+
+def _positions(offsets):
+    """Generate the rows of each position within a set of groups
+
+    The groups are the rows offsets[n]:offsets[n+1]. Generates a tuple
+    (n, rows) with the n-th row of each group with more than n rows,
+    for n from 0 on, so a computation that runs through each group in
+    order can be done in one vectorized step per position. The groups
+    are ordered by size so each step only touches the groups that
+    still have rows left.
+
+    """
+
+    counts = np.diff(offsets)
+
+    order = np.argsort(-counts, kind="stable")
+    negated_counts = -counts[order]
+    first = offsets[:-1][order]
+
+    for n in range(int(counts.max(initial=0))):
+        remaining = np.searchsorted(negated_counts, -n, side="left")
+
+        yield n, first[:remaining] + n
+
+
+def _overflows(start, util, bw_total):
+    """ List the compute and bw overflows in drawing order """
+
+    compute_rows = np.flatnonzero(util > 1.0)
+    bw_rows = np.flatnonzero(bw_total > 1.0)
+
+    overflows = [(row, 0, (time, "compute", value))
+                 for row, time, value in zip(compute_rows.tolist(),
+                                             start[compute_rows].tolist(),
+                                             util[compute_rows].tolist())]
+
+    overflows.extend((row, 1, (time, "bw", value))
+                     for row, time, value in zip(bw_rows.tolist(),
+                                                 start[bw_rows].tolist(),
+                                                 bw_total[bw_rows].tolist()))
+
+    overflows.sort(key=lambda overflow: overflow[:2])
+
+    return [overflow for _, _, overflow in overflows]
@@ -1,147 +1,612 @@
+import bisect
+import collections
+import contextlib
 import copy
 
 import logging
 
-#n Create a custom logger for this file/module
+# Logger for this module (configured by the application)
 logger = logging.getLogger(__name__)
-console_handler = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logger.setLevel(logging.INFO)
-logger.addHandler(console_handler)
 
 
+class IntervalTracer:
+    """Trace the events of the interval builder and the throttler
+
+    The events are:
+      - "interval" - an interval is emitted (interval)
+      - "split" - a kernel is split at the end of an interval
+        (kernel, time)
+      - "remainder" - the rest of a split kernel is carried into the
+        next interval (kernel)
+      - "throttle" - an overutilized interval is scaled (interval or,
+        for a KernelStore, the interval index, and scale)
+
+    The number of each event is kept in counts, and if a hook is
+    given it is called as hook(event, **details) for each event.
+
+    Tracing is off (and costs nothing) unless a tracer is installed
+    with set_tracer() or tracing().
+
+    """
+
+    def __init__(self, hook=None):
+
+        self.counts = collections.Counter()
+        self.hook = hook
+
+    def __call__(self, event, **details):
+
+        self.counts[event] += 1
+
+        if self.hook is not None:
+            self.hook(event, **details)
+
+
+# The installed IntervalTracer (or None)
+_tracer = None
+
+
+def set_tracer(tracer):
+    """ Install an IntervalTracer (or None), returning the previous one """
+
+    global _tracer
+
+    previous = _tracer
+    _tracer = tracer
+
+    return previous
+
+
+def current_tracer():
+    """ Return the installed IntervalTracer (or None) """
+
+    return _tracer
+
+
+@contextlib.contextmanager
+def tracing(hook=None):
+    """Trace the interval builder and throttler in a with statement
+
+    Yields the installed IntervalTracer, e.g.:
+
+        with tracing() as tracer:
+            cascade.throttle()
+
+        print(tracer.counts)
+
+    """
+
+    tracer = IntervalTracer(hook)
+    previous = set_tracer(tracer)
+
+    try:
+        yield tracer
+    finally:
+        set_tracer(previous)
+
 
 class Intervals:
+
+    # Incremented whenever the intervals change
+    version = 0
+
+    # Maximum number of intervals between checkpoints of the sweep
+    checkpoint_spacing = 64
+
+    # IntervalIndex for time queries and the version it was built for
+    _time_index = (None, None)
+
+    # Aggregate statistics and the version they were computed for
+    _stats = (None, None)
+
+    # Whether intervals (and their kernels) are shared (see throttled())
+    _shared_kernels = False
+
     def __init__(self, kernels):
 
         logger.debug("Initialize intervals")
 
+        # The kernels are iterated more than once, so create them once
+        # if they are created on demand (e.g., by a KernelStore)
+        if not isinstance(kernels, list):
+            kernels = list(kernels)
+
+        if _is_sequential(kernels):
+            # Already sorted, and every kernel is an interval
+            self.kernels = list(kernels)
+
+            self.intervals = []
+            self._group_sequential_kernels(kernels)
+            return
+
         # Sort by (start time, end time)
         self.kernels = sorted(kernels, key=lambda k: (k.start, -k.duration))
 
         self.intervals = []
         self._group_kernels_into_intervals(kernels)
 
+    @classmethod
+    def fromStore(cls, store):
+        """Create intervals backed by a columnar KernelStore
+
+        The rows of the store are grouped into intervals first (if
+        they are not already). Interval and Kernel instances are then
+        only created when the intervals are indexed or iterated.
+
+        """
+
+        if store.offsets is None:
+            store = store.grouped()
+
+        intervals = cls.__new__(cls)
+        intervals.kernels = []
+        intervals._intervals = None
+        intervals._store = store
+        intervals._num_kernels = len(store)
+        intervals._checkpoints = None
+
+        return intervals
+
+    @property
+    def store(self):
+        """ The KernelStore backing the intervals (or None) """
+
+        return self._store
+
+    @property
+    def intervals(self):
+        """ List of Interval instances (created on demand for a store) """
+
+        if self._store is not None:
+            return list(self._store.iter_intervals())
+
+        return self._intervals
+
+    @intervals.setter
+    def intervals(self, intervals):
+
+        self._intervals = intervals
+        self._store = None
+        self._num_kernels = sum(len(interval) for interval in intervals)
+
+        # Only intervals grouped from kernels can be updated incrementally
+        self._events = None
+        self._inputs = None
+        self._checkpoints = None
+        self._event_keys = None
+        self._kernel_keys = None
+
+        self._changed()
+
+    @property
+    def num_kernels(self):
+        """ Number of kernels in all the intervals """
+
+        return self._num_kernels
+
+    def _changed(self):
+        """ Record that the intervals have changed """
+
+        self.version += 1
+
     def _group_kernels_into_intervals(self, kernels):
-        """Group kernels into intervals based on overlapping durations and same start time."""
-
-        # Copy the sorted list to events (why?)
-        events = list(kernels)
-
-        while events:
-            # Get the next kernel and its start time
-            kernel = events.pop(0)
-
-            # Initialize the minimum end time with the first kernel's end time
-            current_start_time = kernel.start
-            min_end_time = kernel.end
-
-            # Start a new interval with the current kernel
-            # Collect all kernels that start at the same time
-            active_kernels = [kernel]
-            while events and events[0].start == current_start_time:
-                next_kernel = events.pop(0)
-                active_kernels.append(next_kernel)
-                min_end_time = min(min_end_time, next_kernel.end)
-
-            # Check if there are any subsequent kernels starting before the min_end_time
-            # If so, chop off the interval at the time that kernel starts
-            for event in events:
-                # TODO: Optimize so we don't traverse the whole list
-                min_end_time = min(min_end_time, event.start)
-
-            logger.debug(f"{min_end_time = }")
-
-            # Now go through kernels in the interval to split them appropriately
-            updated_kernels = []
-
-            for idx in reversed(range(len(active_kernels))):
-                active_kernel = active_kernels[idx]
-
-                if active_kernel.end == min_end_time:
-                    logger.debug(f"Adding: {active_kernel}")
-                    updated_kernels.append(active_kernel.copy())
-                else:
-                    logger.debug(f"Splitting: {active_kernel}")
-                    # Split the kernel
-                    first_part, remainder = active_kernel.split(min_end_time)
-
-                    # Replace the original full kernel in the interval with the first part
-                    if first_part is not None:
-                        logger.debug(f"First part: {first_part}")
-                        updated_kernels.append(first_part)
-
-                    # Insert the remainder back at the front of the events list
-                    if remainder is not None:
-                        logger.debug("Remainder {remainder}")
-                        events.insert(0, remainder)
-
-            # After processing, add the adjusted active kernels to the interval
-            interval = Interval()
-            interval.kernels = updated_kernels
-            interval.check()
-
-            # Append new interval to intervals
-            self.intervals.append(interval)
+        """Group kernels into intervals based on overlapping durations and same start time.
+
+        The kernels are swept once in start time order (see _sweep()).
+        The sorted kernels and checkpoints of the state of the sweep
+        are kept for incremental updates (see insert()).
+
+        """
+
+        # Sort by start time (stable, so kernels that start at the same
+        # time keep their original order)
+        self._events = sorted(kernels, key=lambda k: k.start)
+        self._checkpoints = []
+
+        # The original order of the kernels
+        self._inputs = list(kernels)
+
+        since_checkpoint = 0
+
+        for next_kernel, remainders, interval in _sweep(self._events, 0):
+            checkpoint, since_checkpoint = self._checkpoint(next_kernel, remainders, since_checkpoint)
+
+            self._intervals.append(interval)
+            self._checkpoints.append(checkpoint)
+            self._num_kernels += len(interval)
+
+    def _group_sequential_kernels(self, kernels):
+        """Put each of a sequence of kernels in its own interval
+
+        The kernels must start one after another without overlapping
+        (see _is_sequential()), so sweeping them would not split any
+        of them. The intervals, and the state kept for incremental
+        updates, are the same as _group_kernels_into_intervals() would
+        give.
+
+        """
+
+        self._events = list(kernels)
+        self._inputs = list(kernels)
+
+        # Every interval starts without remainders
+        self._checkpoints = list(kernels)
+
+        intervals = self._intervals
+
+        # Each interval gets the list of its one kernel (rather than
+        # an empty list that is then replaced)
+        intervals.extend([Interval([kernel.copy()]) for kernel in kernels])
+
+        self._num_kernels += len(kernels)
+
+        if _tracer is not None:
+            for interval in intervals:
+                _tracer("interval", interval=interval)
+
+    def _checkpoint(self, next_kernel, remainders, since_checkpoint):
+        """Checkpoint the state of a sweep at the start of an interval
+
+        The state is checkpointed if it has no remainders (as the
+        kernel starting the interval) or else every checkpoint_spacing
+        intervals (as a tuple of the next kernel and the remainders).
+        Returns the checkpoint (or None) and the number of intervals
+        since the last checkpoint.
+
+        """
+
+        if not remainders:
+            return next_kernel, 0
+
+        if since_checkpoint >= self.checkpoint_spacing:
+            return (next_kernel, remainders), 0
+
+        return None, since_checkpoint + 1
+
+    def insert(self, kernel):
+        """Add a kernel to the intervals
+
+        Only the intervals in the time window affected by the kernel
+        are regrouped, and the result is the same as for a new
+        Intervals() with the kernel added to the end of the kernels.
+
+        """
+
+        self._check_incremental()
+
+        seq = self._next_seq
+        self._next_seq += 1
+
+        self._add_event(kernel, seq)
+        self._regroup(kernel.start, kernel.start)
+
+    def remove(self, kernel):
+        """ Remove a kernel from the intervals (see insert()) """
+
+        self._check_incremental()
+
+        self._remove_event(kernel)
+        self._regroup(kernel.start, kernel.start)
+
+    def update_kernel(self, kernel, **attributes):
+        """Change attributes (e.g., start or duration) of a kernel
+
+        The kernel must have been added to the intervals, and its
+        attributes must only be changed with this method. As for
+        insert() only the affected intervals are regrouped.
+
+        """
+
+        self._check_incremental()
+
+        seq = self._remove_event(kernel)
+        old_start = kernel.start
+
+        for attribute, value in attributes.items():
+            setattr(kernel, attribute, value)
+
+        self._add_event(kernel, seq)
+        self._regroup(min(old_start, kernel.start), max(old_start, kernel.start))
+
+    def _check_incremental(self):
+
+        if self._checkpoints is None:
+            raise ValueError("Incremental updates need intervals grouped from kernels "
+                             "(not throttled or backed by a store)")
+
+        if self._event_keys is None:
+            # Keys to find the position of a kernel in the sorted
+            # kernels, where seq is the kernel's position in the
+            # original order
+            seqs = {id(kernel): seq for seq, kernel in enumerate(self._inputs)}
+
+            self._event_keys = [(kernel.start, seqs[id(kernel)])
+                                for kernel in self._events]
+            self._kernel_keys = [(kernel.start, -kernel.duration, seqs[id(kernel)])
+                                 for kernel in self.kernels]
+
+            self._next_seq = len(self._inputs)
+            self._inputs = None
+
+    def _add_event(self, kernel, seq):
+
+        key = (kernel.start, seq)
+        position = bisect.bisect_left(self._event_keys, key)
+        self._events.insert(position, kernel)
+        self._event_keys.insert(position, key)
+
+        key = (kernel.start, -kernel.duration, seq)
+        position = bisect.bisect_left(self._kernel_keys, key)
+        self.kernels.insert(position, kernel)
+        self._kernel_keys.insert(position, key)
+
+    def _remove_event(self, kernel):
+        """ Remove a kernel from the sorted kernels and return its seq """
+
+        position = bisect.bisect_left(self._event_keys, (kernel.start,))
+
+        while position < len(self._events) and self._event_keys[position][0] == kernel.start:
+            if self._events[position] is kernel:
+                seq = self._event_keys[position][1]
+
+                del self._events[position]
+                del self._event_keys[position]
+
+                position = bisect.bisect_left(self._kernel_keys,
+                                              (kernel.start, -kernel.duration, seq))
+                del self.kernels[position]
+                del self._kernel_keys[position]
+
+                return seq
+
+            position += 1
+
+        raise ValueError(f"Kernel not in intervals: {kernel}")
+
+    def _regroup(self, first_time, last_time):
+        """Regroup the intervals after changing kernels between first_time and last_time
+
+        The sweep restarts from the last checkpoint before first_time
+        (or at first_time if it has no remainders), since everything
+        before it is unchanged. It stops at the first checkpoint after
+        last_time where the new sweep is in the same state, since from
+        there on the intervals would also be unchanged.
+
+        """
+
+        intervals = self._intervals
+        checkpoints = self._checkpoints
+
+        first = self._interval_index(first_time) - 1
+
+        while first > 0:
+            checkpoint = checkpoints[first]
+
+            if checkpoint is not None and (not isinstance(checkpoint, tuple)
+                                           or intervals[first].start < first_time):
+                break
+
+            first -= 1
+
+        if first <= 0:
+            first = 0
+            next_event = 0
+            remainders = ()
+        else:
+            next_event = bisect.bisect_left(self._event_keys, (intervals[first].start,))
+            remainders = checkpoints[first][1] if isinstance(checkpoints[first], tuple) else ()
+
+        new_intervals = []
+        new_checkpoints = []
+        since_checkpoint = 0
+
+        last = first
+
+        for next_kernel, remainders, interval in _sweep(self._events, next_event, remainders):
+            start = interval.start
+
+            if start > last_time:
+                while last < len(intervals) and intervals[last].start < start:
+                    last += 1
+
+                if (last < len(intervals)
+                    and intervals[last].start == start
+                    and _same_state(checkpoints[last], next_kernel, remainders)):
+
+                    # The new sweep has caught up with the old one
+                    break
+
+            checkpoint, since_checkpoint = self._checkpoint(next_kernel, remainders, since_checkpoint)
+
+            new_intervals.append(interval)
+            new_checkpoints.append(checkpoint)
+            self._num_kernels += len(interval)
+        else:
+            last = len(intervals)
+
+        self._num_kernels -= sum(len(interval) for interval in intervals[first:last])
+
+        intervals[first:last] = new_intervals
+        checkpoints[first:last] = new_checkpoints
+
+        self._changed()
+
+    def _interval_index(self, time):
+        """ Number of intervals that start at or before time """
+
+        intervals = self._intervals
+        low, high = 0, len(intervals)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if time < intervals[middle].start:
+                high = middle
+            else:
+                low = middle + 1
+
+        return low
 
     def __len__(self):
 
-        return len(self.intervals)
+        if self._store is not None:
+            return self._store.num_intervals
+
+        return len(self._intervals)
 
     def __iter__(self):
         """Return an iterator over the interval instances."""
 
-        return iter(self.intervals)
+        if self._store is not None:
+            return self._store.iter_intervals()
+
+        return iter(self._intervals)
 
     def __getitem__(self, index):
         """ Return an indexed interval """
 
+        if self._store is not None and isinstance(index, int):
+            if index < 0:
+                index += len(self)
+
+            if not 0 <= index < len(self):
+                raise IndexError("Intervals index out of range")
+
+            return self._store.interval(index)
+
         return self.intervals[index]
 
     def copy(self):
 
+        if self._store is not None:
+            return Intervals.fromStore(self._store.copy())
+
         return copy.deepcopy(self)
 
-    def duration(self):
-        """ Find duration of cascade """
+    def stats(self):
+        """Return aggregate statistics of the intervals
 
-        total_duration = 0
+        The statistics are computed in a single pass over the kernels
+        and cached until the intervals change (through the methods of
+        Intervals), so the returned dictionary should not be modified.
+        It holds:
 
-        for interval in self.intervals:
-            total_duration += interval.duration
+          - duration - total duration of the intervals
+          - compute_util_time, bw_util_time - total utilization * duration
+          - peak_compute_util, peak_bw_util - highest total utilization
+            of any interval
+          - time_over_capacity - total duration of the intervals with a
+            total compute or bw utilization over 1.0
+          - names - a dictionary with the duration, compute_util_time
+            and bw_util_time of the kernels with each name
 
-        return total_duration
+        """
 
-    def avg_compute_util(self):
-        """ Average compute utilization """
+        version, stats = self._stats
+
+        if stats is None or version != self.version:
+            if self._store is not None:
+                stats = self._store.stats()
+            else:
+                stats = self._compute_stats()
+
+            self._stats = (self.version, stats)
+
+        return stats
+
+    def _compute_stats(self):
 
-        total_compute = 0
         total_duration = 0
+        total_compute = 0
+        total_bw = 0
+
+        peak_compute = 0
+        peak_bw = 0
+        time_over_capacity = 0
+
+        # Name -> [duration, compute_util_time, bw_util_time]
+        names = {}
 
-        for interval in self.intervals:
+        for interval in self._intervals:
             interval_duration = interval.duration
-            total_compute += interval_duration * interval.compute_util()
+
+            compute_util = 0
+            bw_util = 0
+
+            for kernel in interval.kernels:
+                compute_util += kernel.compute_util
+                bw_util += kernel.bw_util
+
+                totals = names.get(kernel.name)
+                if totals is None:
+                    totals = names[kernel.name] = [0, 0, 0]
+
+                totals[0] += kernel.duration
+                totals[1] += kernel.duration * kernel.compute_util
+                totals[2] += kernel.duration * kernel.bw_util
+
             total_duration += interval_duration
+            total_compute += interval_duration * compute_util
+            total_bw += interval_duration * bw_util
+
+            peak_compute = max(peak_compute, compute_util)
+            peak_bw = max(peak_bw, bw_util)
+
+            if compute_util > 1.0 or bw_util > 1.0:
+                time_over_capacity += interval_duration
+
+        return {"duration": total_duration,
+                "compute_util_time": total_compute,
+                "bw_util_time": total_bw,
+                "peak_compute_util": peak_compute,
+                "peak_bw_util": peak_bw,
+                "time_over_capacity": time_over_capacity,
+                "names": {name: {"duration": duration,
+                                 "compute_util_time": compute,
+                                 "bw_util_time": bw}
+                          for name, (duration, compute, bw) in names.items()}}
+
+    def duration(self):
+        """ Find duration of cascade """
+
+        return self.stats()["duration"]
+
+    def avg_compute_util(self):
+        """ Average compute utilization """
 
-        return total_compute/total_duration
+        stats = self.stats()
+
+        return stats["compute_util_time"]/stats["duration"]
 
 
     def avg_bw_util(self):
         """ Average bw utilization """
 
-        total_bw = 0
-        total_duration = 0
-
-        for interval in self.intervals:
-            interval_duration = interval.duration
-            total_bw += interval_duration * interval.bw_util()
-            total_duration += interval_duration
+        stats = self.stats()
 
-        return total_bw/total_duration
+        return stats["bw_util_time"]/stats["duration"]
 
 
     def throttle(self):
+        """Throttle the intervals in place
+
+        Intervals shared with another set of intervals by throttled()
+        are copied first, so the other set is left unchanged.
+
+        """
+
+        self._changed()
+
+        # Throttled intervals no longer match their kernels
+        self._checkpoints = None
+
+        if self._store is not None:
+            self._store.throttle()
+            return self
+
+        if self._shared_kernels:
+            self._intervals = [interval.copy() for interval in self._intervals]
+            self._shared_kernels = False
 
         prev_end_time = 0
 
@@ -159,6 +624,43 @@ class Intervals:
         return self
 
 
+    def throttled(self):
+        """Return a throttled version of the intervals
+
+        Unlike throttle() this leaves these intervals unchanged. The
+        kernels of the new intervals are shallow copies, which share
+        their origins with these kernels (rather than the deep copies
+        made by copy()). The intervals that throttling does not change
+        (i.e., they keep their start time and are within the resource
+        limits) are shared with the new intervals.
+
+        Note: Since start times are absolute, once an interval is
+        shifted all later intervals are shifted too, so only the
+        intervals before the first throttled one are shared (which
+        for an overutilized cascade is usually very few of them).
+        throttle() copies shared intervals before changing them.
+
+        """
+
+        if self._store is not None:
+            return Intervals.fromStore(self._store.throttled())
+
+        new_intervals = []
+        prev_end_time = 0
+
+        for interval in self._intervals:
+            interval, prev_end_time = interval.throttled(prev_end_time)
+            new_intervals.append(interval)
+
+        throttled_intervals = Intervals.__new__(Intervals)
+        throttled_intervals.kernels = list(self.kernels)
+        throttled_intervals.intervals = new_intervals
+
+        self._shared_kernels = True
+        throttled_intervals._shared_kernels = True
+
+        return throttled_intervals
+
     def flatten(self):
         """Returns a flat list of kernels
 
@@ -166,6 +668,9 @@ class Intervals:
 
         """
 
+        if self._store is not None:
+            return self._store.kernels()
+
         flattened_kernels = []
         prev_end_time = 0
 
@@ -175,6 +680,50 @@ class Intervals:
         return flattened_kernels
 
 
+    def time_index(self):
+        """Return an IntervalIndex for time queries on the intervals
+
+        The index is cached until the intervals change (through the
+        methods of Intervals).
+
+        """
+
+        version, index = self._time_index
+
+        if index is None or version != self.version:
+            index = IntervalIndex.fromIntervals(self)
+            self._time_index = (self.version, index)
+
+        return index
+
+    def interval_at(self, time):
+        """ Return the interval running at time (or None) """
+
+        index = self.time_index().find(time)
+
+        return self[index] if index is not None else None
+
+    def active_kernels(self, time):
+        """ Return the (split) kernels running at time """
+
+        interval = self.interval_at(time)
+
+        return list(interval) if interval is not None else []
+
+    def utilization_at(self, time):
+        """ Return the total (compute, bw) utilization at time """
+
+        return self.time_index().utilization_at(time)
+
+    def utilization(self, start, end):
+        """Return the average (compute, bw) utilization from start to end
+
+        Times when nothing is running count as zero utilization.
+
+        """
+
+        return self.time_index().utilization(start, end)
+
     def pretty_print(self):
         """Pretty print the intervals"""
 
@@ -184,11 +733,252 @@ class Intervals:
                 print(f"Kernel ({k}) - {kernel}")
 
     def __repr__(self):
-        return f"Intervals({len(self.intervals)} intervals)"
+        return f"Intervals({len(self)} intervals)"
+
+class IntervalIndex:
+    """Sorted start time index over intervals for time queries
+
+    Holds the start and end time and the total utilizations of each
+    interval, so the interval running at a time is found by bisection,
+    plus running totals of utilization * duration, so the utilization
+    over a time range takes two lookups.
+
+    """
+
+    def __init__(self, starts, ends, compute_utils, bw_utils):
+
+        self.starts = starts
+        self.ends = ends
+        self.compute_utils = compute_utils
+        self.bw_utils = bw_utils
+
+        # Utilization * duration of all the intervals before each interval
+        self.compute_totals = [0.0]
+        self.bw_totals = [0.0]
+
+        for start, end, compute_util, bw_util in zip(starts, ends, compute_utils, bw_utils):
+            duration = end - start
+
+            self.compute_totals.append(self.compute_totals[-1] + duration * compute_util)
+            self.bw_totals.append(self.bw_totals[-1] + duration * bw_util)
+
+    @classmethod
+    def fromIntervals(cls, intervals):
+        """ Create the index for an Intervals """
+
+        store = intervals.store
+
+        if store is not None:
+            first = store.interval_starts()
+            compute_utils, bw_utils = store.segment_sums(store.compute_util, store.bw_util)
+
+            return cls(store.start[first].tolist(),
+                       store.end[first].tolist(),
+                       compute_utils.tolist(),
+                       bw_utils.tolist())
+
+        return cls([interval.start for interval in intervals],
+                   [interval.end for interval in intervals],
+                   [interval.compute_util() for interval in intervals],
+                   [interval.bw_util() for interval in intervals])
+
+    def __len__(self):
+
+        return len(self.starts)
+
+    def find(self, time):
+        """ Return the index of the interval running at time (or None) """
+
+        index = bisect.bisect_right(self.starts, time) - 1
+
+        if index >= 0 and time < self.ends[index]:
+            return index
+
+        return None
+
+    def utilization_at(self, time):
+        """ Return the total (compute, bw) utilization at time """
+
+        index = self.find(time)
+
+        if index is None:
+            return 0.0, 0.0
+
+        return self.compute_utils[index], self.bw_utils[index]
+
+    def totals(self, time):
+        """ Return the (compute, bw) utilization * duration up to time """
+
+        index = bisect.bisect_right(self.starts, time) - 1
+
+        if index < 0:
+            return 0.0, 0.0
+
+        elapsed = min(time, self.ends[index]) - self.starts[index]
+
+        return (self.compute_totals[index] + elapsed * self.compute_utils[index],
+                self.bw_totals[index] + elapsed * self.bw_utils[index])
+
+    def utilization(self, start, end):
+        """ Return the average (compute, bw) utilization from start to end """
+
+        if end <= start:
+            raise ValueError(f"Empty time range: {start} to {end}")
+
+        start_compute, start_bw = self.totals(start)
+        end_compute, end_bw = self.totals(end)
+
+        duration = end - start
+
+        return (end_compute - start_compute) / duration, (end_bw - start_bw) / duration
+
+
+def _sweep(events, next_event, remainders=()):
+    """Generate the intervals for kernels sorted by start time
+
+    The sweep starts at events[next_event] with the remainders (of
+    kernels split at the end of the interval before). The remainders
+    of the kernels split at the end of an interval all start at that
+    time, so they are carried straight into the next interval rather
+    than being pushed back onto the pending events, and the only
+    pending event that can cut an interval short is the next one.
+    Together with the initial sort this makes the grouping O(n log n)
+    plus the size of the output.
+
+    Generates a tuple (next kernel, remainders, interval) for each
+    interval, where the first two are the state of the sweep at the
+    start of the interval.
+
+    """
+
+    num_events = len(events)
+    remainders = tuple(remainders)
+
+    tracer = _tracer
+
+    while remainders or next_event < num_events:
+        next_kernel = events[next_event] if next_event < num_events else None
+
+        # Start a new interval with the remainders or the next kernel
+        if remainders:
+            active_kernels = list(remainders)
+        else:
+            active_kernels = [next_kernel]
+            next_event += 1
+
+        current_start_time = active_kernels[0].start
+
+        # Collect all kernels that start at the same time
+        while next_event < num_events and events[next_event].start == current_start_time:
+            active_kernels.append(events[next_event])
+            next_event += 1
+
+        # Initialize the minimum end time with the earliest kernel end time
+        min_end_time = min(kernel.end for kernel in active_kernels)
+
+        # If the next kernel starts before the min_end_time chop
+        # off the interval at the time that kernel starts
+        if next_event < num_events:
+            min_end_time = min(min_end_time, events[next_event].start)
+
+        # Now go through kernels in the interval to split them appropriately
+        updated_kernels = []
+        new_remainders = []
+
+        for idx in reversed(range(len(active_kernels))):
+            active_kernel = active_kernels[idx]
+
+            if active_kernel.end == min_end_time:
+                updated_kernels.append(active_kernel.copy())
+            else:
+                if tracer is not None:
+                    tracer("split", kernel=active_kernel, time=min_end_time)
+
+                # Split the kernel
+                first_part, remainder = active_kernel.split(min_end_time)
+
+                # Replace the original full kernel in the interval with the first part
+                if first_part is not None:
+                    updated_kernels.append(first_part)
+
+                # Carry the remainder into the next interval
+                if remainder is not None:
+                    if tracer is not None:
+                        tracer("remainder", kernel=remainder)
+
+                    new_remainders.append(remainder)
+
+        # After processing, add the adjusted active kernels to the interval
+        interval = Interval(updated_kernels)
+        interval.check()
+
+        if tracer is not None:
+            tracer("interval", interval=interval)
+
+        yield next_kernel, remainders, interval
+
+        # Remainders were collected in reverse, restore kernel order
+        remainders = tuple(reversed(new_remainders))
+
+
+def _is_sequential(kernels):
+    """Check if kernels start one after another without overlapping
+
+    Each kernel must start strictly after the one before it (so no
+    two kernels share an interval), and no earlier than it ends.
+
+    """
+
+    last_start = float("-inf")
+    last_end = float("-inf")
+
+    for kernel in kernels:
+        start = kernel.start
+
+        if start <= last_start or start < last_end:
+            return False
+
+        last_start = start
+        last_end = kernel.end
+
+    return True
+
+
+def _same_state(checkpoint, next_kernel, remainders):
+    """ Check if a checkpoint of a sweep is the given state """
+
+    if checkpoint is None:
+        return False
+
+    if not isinstance(checkpoint, tuple):
+        return not remainders and checkpoint is next_kernel
+
+    checkpoint_kernel, checkpoint_remainders = checkpoint
+
+    return (checkpoint_kernel is next_kernel
+            and len(checkpoint_remainders) == len(remainders)
+            and all(_kernel_state(old) == _kernel_state(new)
+                    for old, new in zip(checkpoint_remainders, remainders)))
+
+
+def _kernel_state(kernel):
+
+    return (kernel.name,
+            kernel.start,
+            kernel.duration,
+            kernel.compute_util,
+            kernel.bw_util,
+            kernel.bw_util_limit,
+            kernel.throttled_duration,
+            id(kernel.origin))
+
 
 class Interval:
-    def __init__(self):
-        self.kernels = []
+
+    __slots__ = ("kernels",)
+
+    def __init__(self, kernels=None):
+        self.kernels = [] if kernels is None else kernels
 
     @property
     def start(self):
@@ -212,6 +1002,11 @@ class Interval:
 
         return len(self.kernels)
 
+    def copy(self):
+        """Creates a copy of the interval with copies of its kernels """
+
+        return Interval([kernel.copy() for kernel in self.kernels])
+
     def __iter__(self):
         """Return an iterator over the kernel instances."""
 
@@ -279,6 +1074,29 @@ class Interval:
         return new_end_time
 
 
+    def throttled(self, new_start_time):
+        """Return a throttled version of the interval and its end time
+
+        The interval is moved to new_start_time and its kernels are
+        scaled for overutilization, as done by update_start_times()
+        and scale_durations(), but on copies of the kernels. If
+        nothing would change, the interval itself is returned (which
+        only happens up to the first interval that is shifted).
+
+        """
+
+        max_util = max(self.total_compute_util(), self.total_bw_util())
+
+        if max_util <= 1.0 and all(kernel.start == new_start_time for kernel in self.kernels):
+            return self, max(kernel.end for kernel in self.kernels)
+
+        interval = self.copy()
+
+        new_end_time = interval.update_start_times(new_start_time)
+        scaled_end_time = interval.scale_durations()
+
+        return interval, max(new_end_time, scaled_end_time)
+
     def scale_durations(self):
         """Scales the durations of the kernels
 
@@ -298,6 +1116,9 @@ class Interval:
         if max_util <= 1.0:
             return self.kernels[0].end
 
+        if _tracer is not None:
+            _tracer("throttle", interval=self, scale=max_util)
+
         # Kernel scale factor to make the max_util equal to 1.0
         scale_factor = 1.0 / max_util
 
@@ -1,5 +1,22 @@
 # Class to hold the parameters for Kernel
 class Kernel:
+
+    # Kernels are created by the hundreds of thousands, so keep them
+    # compact (no per-kernel __dict__)
+    __slots__ = ("name",
+                 "start",
+                 "duration",
+                 "throttled_duration",
+                 "compute_util",
+                 "bw_util",
+                 "origin",
+                 "bw_util_limit")
+
+    # Default colors of the kernels by name: name -> (compute_color,
+    # bw_color). Diagrams use the colors of their cascade instead (see
+    # Cascade.assign_colors())
+    _colors = {}
+
     def __init__(self,
                  name,
                  start=0,
@@ -21,8 +38,6 @@ class Kernel:
         else:
             self.origin = origin
         self.bw_util_limit = bw_util_limit
-        self.compute_color = None
-        self.bw_color = None
 
     @property
     def end(self):
@@ -30,6 +45,40 @@ class Kernel:
 
         return self.start + self.duration
 
+    @property
+    def compute_color(self):
+        """ The compute color of the kernels with this name (or None) """
+
+        return self.name_colors(self.name)[0]
+
+    @compute_color.setter
+    def compute_color(self, color):
+
+        self.set_name_color(self.name, color, self.bw_color)
+
+    @property
+    def bw_color(self):
+        """ The bw color of the kernels with this name (or None) """
+
+        return self.name_colors(self.name)[1]
+
+    @bw_color.setter
+    def bw_color(self, color):
+
+        self.set_name_color(self.name, self.compute_color, color)
+
+    @classmethod
+    def name_colors(cls, name):
+        """ Return the (compute color, bw color) of the kernels named name """
+
+        return cls._colors.get(name, (None, None))
+
+    @classmethod
+    def set_name_color(cls, name, compute_color, bw_color):
+        """ Set the (compute color, bw color) of the kernels named name """
+
+        cls._colors[name] = (compute_color, bw_color)
+
     def set_start(self, last_end=0):
         """Sets the start time based on the last end or defaults to 0."""
 
@@ -38,11 +87,16 @@ class Kernel:
         return self
 
     def set_color(self, color):
-        """ Set the color of the kernel. """
+        """Set the color of the kernel.
+
+        Note: colors are kept by name, so this sets the color of all
+        kernels with the same name.
+
+        """
 
-        self.compute_color = color
-        self.bw_color = KernelColor.lightenColor(color,
-                                                 amount=0.5)
+        self.set_name_color(self.name,
+                            color,
+                            KernelColor.lightenColor(color, amount=0.5))
 
         return self
 
@@ -56,7 +110,7 @@ class Kernel:
     def copy(self):
         """Creates a copy of the kernel.
 
-        Note: colors are not copied.
+        Note: the copy has the colors of the kernel (see set_color()).
 
         """
 
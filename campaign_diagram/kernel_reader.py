@@ -0,0 +1,262 @@
+import csv
+import json
+import os
+
+
+class KernelReader:
+    """Reads the kernels of a cascade one at a time from a file
+
+    Supported formats are:
+
+      - "yaml" - the format read by Cascade.fromYAML(), i.e., a
+        "cascade" mapping with a "name" and a list of "kernels"
+
+      - "jsonl" - JSON Lines with one kernel object per line, and
+        optionally a line with a {"cascade": {"name": ...}} object
+
+      - "csv" - a header line with the kernel attribute names
+        followed by one kernel per line
+
+    Iterating over the reader generates a dictionary of attributes
+    (e.g., name, duration, compute_util and bw_util) for each kernel
+    without keeping the parsed file around. Any other cascade
+    attributes found in the file (such as its name) are collected in
+    the "cascade" dictionary while reading.
+
+    YAML is parsed as a stream of events, and each kernel is composed
+    and constructed on its own (see YAMLValues), so values are the
+    same as with Cascade.fromYAML(). The events come from the C parser
+    of ruamel.yaml.clib if it is installed, unless pure is True. The
+    fields of a CSV file are resolved like plain YAML scalars.
+
+    """
+
+    formats = {".yaml": "yaml",
+               ".yml": "yaml",
+               ".jsonl": "jsonl",
+               ".ndjson": "jsonl",
+               ".csv": "csv"}
+
+    def __init__(self, file, format=None, pure=False):
+
+        if format is None:
+            extension = os.path.splitext(file)[1].lower()
+
+            if extension not in self.formats:
+                raise ValueError(f"Unknown kernel file format for {file}")
+
+            format = self.formats[extension]
+
+        if format not in self.formats.values():
+            raise ValueError(f"Unknown kernel file format: {format}")
+
+        self.file = file
+        self.format = format
+        self.pure = pure
+        self.cascade = {}
+
+    def __iter__(self):
+        """Return an iterator over the kernel attribute dictionaries."""
+
+        with open(self.file, 'r', newline='') as file:
+            if self.format == "yaml":
+                yield from self._read_yaml(file)
+            elif self.format == "jsonl":
+                yield from self._read_jsonl(file)
+            else:
+                yield from self._read_csv(file)
+
+    def _read_yaml(self, file):
+
+        from ruamel.yaml.events import (StreamStartEvent, DocumentStartEvent,
+                                        MappingStartEvent, MappingEndEvent,
+                                        SequenceStartEvent, SequenceEndEvent)
+
+        values = YAMLValues(file, pure=self.pure)
+        value = values.value
+        skip = values.skip
+
+        skip(StreamStartEvent)
+        skip(DocumentStartEvent)
+
+        # Find the top level mapping
+        if not skip(MappingStartEvent):
+            return
+
+        while not skip(MappingEndEvent):
+            key = value()
+
+            if key != "cascade" or not skip(MappingStartEvent):
+                value()
+                continue
+
+            while not skip(MappingEndEvent):
+                cascade_key = value()
+
+                if cascade_key == "kernels" and skip(SequenceStartEvent):
+                    while not skip(SequenceEndEvent):
+                        yield value()
+                else:
+                    self.cascade[cascade_key] = value()
+
+    def _read_jsonl(self, file):
+
+        for line in file:
+            if not line.strip():
+                continue
+
+            data = json.loads(line)
+
+            if "cascade" in data:
+                self.cascade.update(data["cascade"])
+            else:
+                yield data
+
+    def _read_csv(self, file):
+
+        resolve_scalar = _scalar_resolver()
+
+        for row in csv.DictReader(file):
+            yield {key: value if key == "name" else resolve_scalar(value)
+                   for key, value in row.items()}
+
+
+class YAMLValues:
+    """Reads the values of a YAML file one at a time
+
+    The events of the file come from YAML.parse() of a ruamel.yaml
+    safe loader. Each value is composed from its events here (with the
+    resolver of the loader, as its composer does), constructed by the
+    constructor of the loader, and then forgotten, so values are the
+    same as with YAML.load() without holding the whole document.
+
+    """
+
+    def __init__(self, file, pure=False):
+
+        # ruamel.yaml is slow to import, so only import it when needed
+        from ruamel.yaml import YAML
+
+        yaml = YAML(typ="safe", pure=pure)
+
+        self.resolver = yaml.resolver
+        self.constructor = yaml.constructor
+
+        self._events = yaml.parse(file)
+        self._event = next(self._events, None)
+
+        # Nodes by anchor (for aliases)
+        self._anchors = {}
+
+    def check(self, event_type):
+        """ Whether the next event is an event_type event """
+
+        return isinstance(self._event, event_type)
+
+    def skip(self, event_type):
+        """ Consume the next event if it is an event_type event """
+
+        if not self.check(event_type):
+            return False
+
+        self._next()
+        return True
+
+    def value(self):
+        """ Compose and construct the next value """
+
+        return self.constructor.construct_document(self.compose())
+
+    def compose(self):
+        """ Compose the node of the next value """
+
+        from ruamel.yaml.composer import ComposerError
+        from ruamel.yaml.events import (AliasEvent, ScalarEvent,
+                                        SequenceStartEvent, SequenceEndEvent,
+                                        MappingEndEvent)
+        from ruamel.yaml.nodes import ScalarNode, SequenceNode, MappingNode
+
+        event = self._next()
+
+        if isinstance(event, AliasEvent):
+            if event.anchor not in self._anchors:
+                raise ComposerError(None, None,
+                                    f"found undefined alias {event.anchor!r}",
+                                    event.start_mark)
+
+            return self._anchors[event.anchor]
+
+        if isinstance(event, ScalarEvent):
+            node = ScalarNode(self._tag(ScalarNode, event, event.value),
+                              event.value,
+                              event.start_mark,
+                              event.end_mark,
+                              style=event.style)
+        elif isinstance(event, SequenceStartEvent):
+            node = SequenceNode(self._tag(SequenceNode, event),
+                                [],
+                                event.start_mark,
+                                None,
+                                flow_style=event.flow_style)
+        else:
+            node = MappingNode(self._tag(MappingNode, event),
+                               [],
+                               event.start_mark,
+                               None,
+                               flow_style=event.flow_style)
+
+        if event.anchor is not None:
+            self._anchors[event.anchor] = node
+
+        if isinstance(node, SequenceNode):
+            while not self.check(SequenceEndEvent):
+                node.value.append(self.compose())
+            node.end_mark = self._next().end_mark
+        elif isinstance(node, MappingNode):
+            while not self.check(MappingEndEvent):
+                key = self.compose()
+                node.value.append((key, self.compose()))
+            node.end_mark = self._next().end_mark
+
+        return node
+
+    def _tag(self, kind, event, value=None):
+        """ The tag of the node of event (resolved if it is not explicit) """
+
+        tag = event.tag
+
+        if tag is None or tag == "!":
+            tag = self.resolver.resolve(kind, value, event.implicit)
+
+        return tag
+
+    def _next(self):
+        """ Consume the next event """
+
+        event = self._event
+        self._event = next(self._events, None)
+
+        return event
+
+
+def _scalar_resolver():
+    """Return a function that converts a plain scalar as YAML does
+
+    The string is resolved (to an int, float, bool, None or str) with
+    the same rules as the plain scalars of a YAML file.
+
+    """
+
+    from ruamel.yaml import YAML
+    from ruamel.yaml.nodes import ScalarNode
+
+    yaml = YAML(typ="safe")
+    resolver = yaml.resolver
+    constructor = yaml.constructor
+
+    def resolve(value):
+        node = ScalarNode(resolver.resolve(ScalarNode, value, (True, False)), value)
+
+        return constructor.construct_document(node)
+
+    return resolve
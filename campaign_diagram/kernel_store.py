@@ -0,0 +1,520 @@
+import copy
+import operator
+
+from array import array
+
+import numpy as np
+
+from campaign_diagram.kernel import *
+from campaign_diagram.intervals import Interval, Intervals, current_tracer
+
+
+class KernelStore:
+    """A columnar (struct-of-arrays) store of kernels
+
+    The numeric kernel attributes are kept in float64 NumPy columns,
+    names are kept as integer ids into a name table, and the origin of
+    each kernel is kept as an integer id, where all the pieces of a
+    split kernel share the same origin id.
+
+    The rows can optionally be grouped into intervals, in which case
+    interval "n" consists of the rows offsets[n]:offsets[n+1].
+
+    Kernel (and Interval) objects are only created on demand when the
+    store is indexed or iterated, and are snapshots of the store, i.e.,
+    changing them does not change the store.
+
+    Columns are replaced, never written in place, so stores derived
+    from each other (e.g., by throttled()) share the columns they have
+    in common.
+
+    """
+
+    columns = ("start",
+               "duration",
+               "compute_util",
+               "bw_util",
+               "bw_util_limit",
+               "throttled_duration")
+
+    def __init__(self,
+                 names,
+                 name_ids,
+                 start,
+                 duration,
+                 compute_util,
+                 bw_util,
+                 bw_util_limit=None,
+                 throttled_duration=None,
+                 origin_ids=None,
+                 offsets=None):
+
+        count = len(name_ids)
+
+        self.names = list(names)
+        self.name_ids = np.asarray(name_ids, dtype=np.int32)
+
+        self.start = np.asarray(start, dtype=np.float64)
+        self.duration = np.asarray(duration, dtype=np.float64)
+        self.compute_util = np.asarray(compute_util, dtype=np.float64)
+        self.bw_util = np.asarray(bw_util, dtype=np.float64)
+
+        if bw_util_limit is None:
+            bw_util_limit = np.ones(count)
+        self.bw_util_limit = np.asarray(bw_util_limit, dtype=np.float64)
+
+        if throttled_duration is None:
+            throttled_duration = np.zeros(count)
+        self.throttled_duration = np.asarray(throttled_duration, dtype=np.float64)
+
+        # By default every kernel is its own origin
+        if origin_ids is None:
+            origin_ids = np.arange(count)
+        self.origin_ids = np.asarray(origin_ids, dtype=np.int64)
+
+        if offsets is not None:
+            offsets = np.asarray(offsets, dtype=np.int64)
+        self.offsets = offsets
+
+        self._origins = {}
+        self._origin_rows = None
+
+    @classmethod
+    def fromKernels(cls, kernels, offsets=None):
+        """ Create a store from an iterable of kernels """
+
+        kernels = list(kernels)
+
+        name2id = {}
+        origin2id = {}
+
+        # One pass per column (rather than per kernel) keeps the loops
+        # in C for the hundreds of thousands of kernels of a cascade
+        name_ids = [name2id.setdefault(kernel.name, len(name2id)) for kernel in kernels]
+        origin_ids = [origin2id.setdefault(id(kernel.origin), len(origin2id)) for kernel in kernels]
+        columns = [list(map(operator.attrgetter(attribute), kernels))
+                   for attribute in cls.columns]
+
+        names = list(name2id)
+
+        return cls(names,
+                   name_ids,
+                   *columns,
+                   origin_ids=origin_ids,
+                   offsets=offsets)
+
+    @classmethod
+    def fromRecords(cls, records):
+        """Create a store from an iterable of kernel attribute dictionaries
+
+        The dictionaries hold the arguments for a Kernel (e.g., from a
+        KernelReader), and are added to the columns one at a time, so
+        no Kernel objects are created.
+
+        """
+
+        name2id = {}
+
+        names = []
+        name_ids = array('i')
+        columns = [array('d') for _ in cls.columns]
+        defaults = (0, 0, 0, 0, 1.0, 0)
+
+        for record in records:
+            name = record.get("name")
+
+            name_id = name2id.get(name)
+            if name_id is None:
+                name_id = len(names)
+                name2id[name] = name_id
+                names.append(name)
+            name_ids.append(name_id)
+
+            for column, attribute, default in zip(columns, cls.columns, defaults):
+                value = record.get(attribute)
+                column.append(default if value is None else value)
+
+        return cls(names, name_ids, *columns)
+
+    @classmethod
+    def fromIntervals(cls, intervals):
+        """ Create a store from a collection of Interval instances """
+
+        kernels = []
+        offsets = [0]
+
+        for interval in intervals:
+            kernels.extend(interval.kernels)
+            offsets.append(len(kernels))
+
+        return cls.fromKernels(kernels, offsets=offsets)
+
+    def __len__(self):
+
+        return len(self.name_ids)
+
+    @property
+    def num_intervals(self):
+        """ Number of intervals (None if rows are not grouped into intervals) """
+
+        if self.offsets is None:
+            return None
+
+        return len(self.offsets) - 1
+
+    @property
+    def end(self):
+        """ End time column """
+
+        return self.start + self.duration
+
+    @property
+    def nbytes(self):
+        """ Number of bytes used by the arrays of the store """
+
+        arrays = [self.name_ids, self.origin_ids]
+        arrays.extend(getattr(self, attribute) for attribute in self.columns)
+
+        if self.offsets is not None:
+            arrays.append(self.offsets)
+
+        return sum(array.nbytes for array in arrays)
+
+    def is_sequential(self):
+        """ Check if no two kernels in the store overlap
+
+        Kernels must also be in start time order and no two kernels
+        may start at the same time.
+
+        """
+
+        if len(self) < 2:
+            return True
+
+        start = self.start
+
+        return bool(np.all(start[1:] >= self.end[:-1]) and np.all(start[1:] != start[:-1]))
+
+    def assign_starts(self, offset=0):
+        """ Assume the kernels are sequential and assign start times """
+
+        if len(self) == 0:
+            return self
+
+        # Accumulate in the same order as Cascade.assign_starts()
+        self.start = np.cumsum(np.concatenate(([offset], self.duration[:-1])))
+
+        return self
+
+    def grouped(self):
+        """Return the store with its kernels grouped into intervals
+
+        Kernels that do not overlap each form their own interval, so
+        that case is handled directly on the columns. Otherwise the
+        kernels are grouped (and split) by Intervals.
+
+        """
+
+        if self.offsets is not None:
+            return self
+
+        if self.is_sequential():
+            store = copy.copy(self)
+            store.offsets = np.arange(len(self)+1)
+            return store
+
+        return KernelStore.fromIntervals(Intervals(self))
+
+    def copy(self):
+        """ Create a copy of the store """
+
+        offsets = None if self.offsets is None else self.offsets.copy()
+
+        return KernelStore(self.names,
+                           self.name_ids.copy(),
+                           *[getattr(self, attribute).copy() for attribute in self.columns],
+                           origin_ids=self.origin_ids.copy(),
+                           offsets=offsets)
+
+    def kernel(self, index):
+        """ Create the Kernel for row "index" """
+
+        return self.kernels(index, index+1)[0]
+
+    def __getitem__(self, index):
+        """ Return an indexed kernel """
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("KernelStore index out of range")
+
+        return self.kernel(index)
+
+    def __iter__(self):
+        """Return an iterator that creates the Kernel instances."""
+
+        chunk = 4096
+
+        for begin in range(0, len(self), chunk):
+            yield from self.kernels(begin, begin+chunk)
+
+    def kernels(self, begin=0, end=None):
+        """ Create a list of the Kernels for rows begin:end """
+
+        rows = slice(begin, end)
+
+        names = self.names
+        columns = [getattr(self, attribute)[rows].tolist() for attribute in self.columns]
+
+        kernels = []
+
+        for (name_id, origin_id, start, duration, compute_util, bw_util, bw_util_limit, throttled_duration) \
+            in zip(self.name_ids[rows].tolist(), self.origin_ids[rows].tolist(), *columns):
+
+            kernels.append(Kernel(name=names[name_id],
+                                  start=start,
+                                  duration=duration,
+                                  compute_util=compute_util,
+                                  bw_util=bw_util,
+                                  origin=self._origin(origin_id),
+                                  bw_util_limit=bw_util_limit,
+                                  throttled_duration=throttled_duration))
+
+        return kernels
+
+    def _origin(self, origin_id):
+        """Return the Kernel that serves as the origin for "origin_id"
+
+        The origin is created (once) from the first row with that
+        origin id, so all the kernels created for the pieces of a split
+        kernel share the same origin.
+
+        """
+
+        origin = self._origins.get(origin_id)
+
+        if origin is None:
+            if self._origin_rows is None:
+                origin_ids, rows = np.unique(self.origin_ids, return_index=True)
+                self._origin_rows = dict(zip(origin_ids.tolist(), rows.tolist()))
+
+            row = self._origin_rows[origin_id]
+
+            origin = Kernel(name=self.names[self.name_ids[row]],
+                            start=float(self.start[row]),
+                            duration=float(self.duration[row]),
+                            compute_util=float(self.compute_util[row]),
+                            bw_util=float(self.bw_util[row]),
+                            bw_util_limit=float(self.bw_util_limit[row]),
+                            throttled_duration=float(self.throttled_duration[row]))
+
+            self._origins[origin_id] = origin
+
+        return origin
+
+    def interval(self, index):
+        """ Create the Interval for interval "index" """
+
+        return Interval(self.kernels(int(self.offsets[index]), int(self.offsets[index+1])))
+
+    def iter_intervals(self):
+        """ Return an iterator that creates the Interval instances """
+
+        for index in range(self.num_intervals):
+            yield self.interval(index)
+
+    def interval_starts(self):
+        """ Row index of the first kernel of each interval """
+
+        return self.offsets[:-1]
+
+    def segment_sums(self, *columns):
+        """Sum columns within each interval
+
+        The sums are accumulated kernel by kernel in the order of the
+        kernels in the interval, so that they match (bit for bit) a
+        Python sum() over the kernels of each Interval. This takes one
+        vectorized step per kernel position, where the intervals are
+        ordered by size so each step only touches the intervals that
+        still have kernels left.
+
+        Returns one array of sums per column.
+
+        """
+
+        offsets = self.offsets
+        counts = np.diff(offsets)
+
+        order = np.argsort(-counts, kind="stable")
+        negated_counts = -counts[order]
+        position = offsets[:-1][order]
+
+        sorted_sums = [np.zeros(len(counts)) for _ in columns]
+
+        for n in range(int(counts.max(initial=0))):
+            # Rows of the n-th kernel of the intervals with more than n kernels
+            remaining = np.searchsorted(negated_counts, -n, side="left")
+            rows = position[:remaining] + n
+
+            for column, column_sums in zip(columns, sorted_sums):
+                column_sums[:remaining] += column[rows]
+
+        sums = []
+
+        for column_sums in sorted_sums:
+            unsorted_sums = np.empty_like(column_sums)
+            unsorted_sums[order] = column_sums
+            sums.append(unsorted_sums)
+
+        return sums
+
+    def total_duration(self):
+        """ Sum of the interval durations """
+
+        return sequential_sum(self.duration[self.interval_starts()])
+
+    def avg_util(self, column):
+        """ Duration weighted average over the intervals of a utilization column """
+
+        durations = self.duration[self.interval_starts()]
+
+        sums, = self.segment_sums(column)
+
+        return sequential_sum(durations * sums) / sequential_sum(durations)
+
+    def stats(self):
+        """ Aggregate statistics of the intervals (see Intervals.stats()) """
+
+        durations = self.duration[self.interval_starts()]
+        compute_utils, bw_utils = self.segment_sums(self.compute_util, self.bw_util)
+
+        over_capacity = (compute_utils > 1.0) | (bw_utils > 1.0)
+
+        names = {}
+
+        if len(self):
+            counts = np.bincount(self.name_ids, minlength=len(self.names))
+            totals = [np.bincount(self.name_ids, weights=weights, minlength=len(self.names))
+                      for weights in (self.duration,
+                                      self.duration * self.compute_util,
+                                      self.duration * self.bw_util)]
+
+            for name_id in np.flatnonzero(counts).tolist():
+                duration, compute, bw = (float(total[name_id]) for total in totals)
+                names[self.names[name_id]] = {"duration": duration,
+                                              "compute_util_time": compute,
+                                              "bw_util_time": bw}
+
+        return {"duration": sequential_sum(durations),
+                "compute_util_time": sequential_sum(durations * compute_utils),
+                "bw_util_time": sequential_sum(durations * bw_utils),
+                "peak_compute_util": float(compute_utils.max(initial=0)),
+                "peak_bw_util": float(bw_utils.max(initial=0)),
+                "time_over_capacity": sequential_sum(durations[over_capacity]),
+                "names": names}
+
+    def throttle(self):
+        """Throttle the intervals to keep within resource constraints
+
+        This is a batched version of Intervals.throttle(). Finding the
+        utilization of each interval is a segmented sum and laying out
+        the intervals one after another is a prefix sum over their new
+        durations. The results are the same (bit for bit) as throttling
+        the Interval instances.
+
+        """
+
+        columns = self._throttled_columns()
+
+        for attribute, column in columns.items():
+            setattr(self, attribute, column)
+
+        # The origins created so far have the unthrottled values
+        if columns:
+            self._origins = {}
+
+        return self
+
+    def throttled(self):
+        """Return a throttled version of the store
+
+        The new store shares the name table, ids and interval offsets
+        with this store, as well as any column that throttling leaves
+        unchanged.
+
+        """
+
+        store = copy.copy(self)
+        store._origins = {}
+
+        for attribute, column in self._throttled_columns().items():
+            setattr(store, attribute, column)
+
+        return store
+
+    def _throttled_columns(self):
+        """ Compute the columns changed by throttling """
+
+        first = self.interval_starts()
+        counts = np.diff(self.offsets)
+
+        if len(first) == 0:
+            return {}
+
+        # Maximum of the total compute and bw utilization of each interval
+        max_util = np.maximum(*self.segment_sums(self.compute_util, self.bw_util))
+
+        columns = {}
+
+        scale_interval = max_util > 1.0
+
+        tracer = current_tracer()
+
+        if tracer is not None:
+            for index in np.flatnonzero(scale_interval):
+                tracer("throttle", interval=int(index), scale=float(max_util[index]))
+
+        # Scale the kernels of the overutilized intervals (scaling the
+        # other intervals by exactly 1.0 leaves them unchanged)
+        if scale_interval.any():
+            scale = np.repeat(np.where(scale_interval, max_util, 1.0), counts)
+
+            columns["duration"] = self.duration * scale
+            columns["throttled_duration"] = (self.throttled_duration * scale
+                                             + (columns["duration"] - self.duration))
+
+            scale_factor = 1.0 / scale
+            columns["compute_util"] = self.compute_util * scale_factor
+            columns["bw_util"] = self.bw_util * scale_factor
+
+        duration = columns.get("duration", self.duration)
+
+        # An interval lasts until its longest unscaled kernel or its
+        # (uniformly) scaled kernels end. Since rounding is monotonic,
+        # taking the maximum before adding the start time gives the
+        # same end time as Interval.update_start_times().
+        span = np.maximum(np.maximum.reduceat(self.duration, first),
+                          duration[first])
+
+        # Intervals start one after another (accumulated left to right)
+        interval_start = np.cumsum(np.concatenate(([0.0], span[:-1])))
+        start = np.repeat(interval_start, counts)
+
+        if not np.array_equal(start, self.start):
+            columns["start"] = start
+
+        return columns
+
+    def __repr__(self):
+        return f"KernelStore({len(self)} kernels, {self.num_intervals} intervals)"
+
+
+def sequential_sum(values):
+    """ Sum values left to right (like Python's sum()) """
+
+    if len(values) == 0:
+        return 0
+
+    return float(np.cumsum(values)[-1])
@@ -0,0 +1,408 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from campaign_diagram.cascade import *
+
+
+# Colors (other than hex colors) used by the diagrams
+NAMED_COLORS = {"lightgray": "#D3D3D3",
+                "white": "#FFFFFF"}
+
+
+class RasterDiagram:
+    """Render a campaign diagram without matplotlib
+
+    The same compute lines, bw rectangles and available bw rectangles
+    as CampaignDiagram (see DrawingData) are rasterized straight into a
+    NumPy image buffer, which can be encoded as a PNG with the standard
+    library (see encode_png()), so no plotting library or GUI toolkit
+    is needed.
+
+    The image only holds the plot area of the diagram, with the same
+    limits as CampaignDiagram, but no title, axes or legend (which
+    would need a font renderer). Rectangles narrower than a pixel are
+    drawn into one pixel column with their opacity scaled by their
+    width.
+
+    """
+
+    def __init__(self, cascade, color_map=None):
+
+        # The colors of the kernels by name, which later changes to
+        # the colors of the cascade do not change
+        self.colors = dict(cascade.assign_colors(color_map))
+        self.cascade = cascade
+
+        # Overflows found when the diagram was last drawn
+        self.overflows = []
+
+    def render(self, bw_util_scaling=0.25, width=1280, height=960, line_width=2,
+               lod=False, resolution=None):
+        """Render the campaign diagram into a new image
+
+        With lod=True the diagram is drawn as bands of resolution wide
+        (by default one per pixel column), see
+        CampaignDiagram.render_bands().
+
+        Returns the image as an array of (height, width, 3) uint8 RGB
+        values.
+
+        """
+
+        canvas = _Canvas(width, height, line_width)
+
+        if lod:
+            if resolution is None:
+                bands = DrawingBands.fromIntervals(self.cascade.intervals, bands=width)
+            else:
+                bands = DrawingBands.fromIntervals(self.cascade.intervals, resolution=resolution)
+
+            min_compute_util, max_compute_util = bands.util_range(bw_util_scaling)
+
+            canvas.set_limits(bands.edges[0], bands.edges[-1],
+                              min_compute_util - bw_util_scaling,
+                              max_compute_util + bw_util_scaling)
+
+            self.render_bands(canvas, bands, bw_util_scaling)
+        else:
+            data = self.cascade.drawing_data()
+            self.overflows = list(data.overflows)
+
+            min_compute_util, max_compute_util = data.util_range(bw_util_scaling)
+
+            canvas.set_limits(data.start_min, data.end_max,
+                              min_compute_util - bw_util_scaling,
+                              max_compute_util + bw_util_scaling)
+
+            self.render_data(canvas, data, bw_util_scaling)
+
+        return canvas.image()
+
+    def render_data(self, canvas, data, bw_util_scaling):
+        """ Draw DrawingData on canvas """
+
+        compute_colors, bw_colors = data.colors(self.colors)
+
+        compute_rgb = _rgb_array(compute_colors)[data.name_ids]
+        bw_rgb = _rgb_array(bw_colors)[data.name_ids]
+
+        memory_bottom, memory_height, bw_bottom, bw_height = data.rectangles(bw_util_scaling)
+
+        left = data.start
+        right = data.start + data.width
+
+        # Rectangles are drawn below the lines (as by matplotlib)
+        canvas.fill(left, right, memory_bottom, memory_bottom + memory_height, bw_rgb, 0.5)
+        canvas.fill(left, right, bw_bottom, bw_bottom + bw_height,
+                    _rgb_array(["lightgray"]), 0.3)
+
+        throttle_point = data.end - data.throttled_duration
+
+        connected = ~np.isnan(data.next_util)
+        canvas.vlines(data.end[connected],
+                      data.util[connected],
+                      data.next_util[connected],
+                      compute_rgb[connected])
+
+        canvas.hlines(data.start, throttle_point, data.util, compute_rgb)
+
+        throttled = data.throttled_duration != 0
+        canvas.hlines(throttle_point[throttled],
+                      data.end[throttled],
+                      data.util[throttled],
+                      compute_rgb[throttled],
+                      dotted=True)
+
+    def render_bands(self, canvas, bands, bw_util_scaling):
+        """ Draw DrawingBands on canvas """
+
+        left = bands.edges[:-1]
+        right = bands.edges[1:]
+
+        bw_rgb = _rgb_array([LOD_BW_COLOR])
+
+        for bw_util, alpha in ((bands.bw_max, 0.2), (bands.bw_avg, 0.4), (bands.bw_min, 0.6)):
+            height = bw_util_scaling * bw_util
+
+            canvas.fill(left, right,
+                        bands.compute_avg - height / 2,
+                        bands.compute_avg + height / 2,
+                        bw_rgb, alpha)
+
+        canvas.fill(left, right, bands.compute_min, bands.compute_max,
+                    _rgb_array(["lightgray"]), 0.5)
+
+        compute_rgb = _rgb_array([LOD_COMPUTE_COLOR])
+
+        canvas.hlines(left, right, bands.compute_avg, compute_rgb, line_width=1)
+        canvas.vlines(right[:-1], bands.compute_avg[:-1], bands.compute_avg[1:], compute_rgb,
+                      line_width=1)
+
+    def save(self, file, compression=6, **kwargs):
+        """Save the campaign diagram as a PNG
+
+        The file can be a path or a file-like object. The other
+        arguments are passed to render().
+
+        Returns the summary() of the diagram.
+
+        """
+
+        png = encode_png(self.render(**kwargs), compression=compression)
+
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, "wb") as output:
+                output.write(png)
+        else:
+            file.write(png)
+
+        return self.summary()
+
+    def summary(self):
+        """ Return the summary statistics (see CampaignDiagram.summary()) """
+
+        return diagram_summary(self.cascade, self.overflows)
+
+
+class _Canvas:
+    """ An RGB image with data coordinates for drawing a diagram """
+
+    def __init__(self, width, height, line_width):
+
+        self.width = width
+        self.height = height
+        self.line_width = line_width
+
+        self.pixels = np.ones((height, width, 3), dtype=np.float32)
+
+    def set_limits(self, start, end, bottom, top):
+        """ Map times start to end and utilizations bottom to top to the image """
+
+        # Same margins as CampaignDiagram.format_axes()
+        start -= 0.1
+        end += 0.1
+
+        self.x_scale = self.width / (end - start)
+        self.x_offset = start
+
+        self.y_scale = self.height / (top - bottom)
+        self.y_offset = top
+
+    def columns(self, time):
+
+        return (np.asarray(time, dtype=np.float64) - self.x_offset) * self.x_scale
+
+    def rows(self, util):
+
+        return (self.y_offset - np.asarray(util, dtype=np.float64)) * self.y_scale
+
+    def fill(self, left, right, bottom, top, rgb, alpha):
+        """Blend rectangles (in data coordinates) into the image in order
+
+        The rgb is an (n, 3) array with the color of each rectangle (or
+        a single color), and alpha the opacity of the rectangles.
+
+        """
+
+        x0 = self.columns(left)
+        x1 = self.columns(right)
+
+        c0 = np.floor(x0 + 0.5)
+        c1 = np.floor(x1 + 0.5)
+
+        # Narrow rectangles cover part of one pixel column
+        opacity = np.full(len(x0), float(alpha))
+        narrow = c1 <= c0
+        c0[narrow] = np.floor(x0[narrow])
+        c1[narrow] = c0[narrow] + 1
+        opacity[narrow] *= np.clip(x1[narrow] - x0[narrow], 0.0, 1.0)
+
+        r0 = np.floor(self.rows(top) + 0.5)
+        r1 = np.maximum(np.floor(self.rows(bottom) + 0.5), r0 + 1)
+
+        c0, c1 = _clip(c0, c1, self.width)
+        r0, r1 = _clip(r0, r1, self.height)
+
+        # Nothing is drawn for zero height or off-image rectangles
+        drawn = (top > bottom) & (c1 > c0) & (r1 > r0) & (opacity > 0)
+
+        rgb = np.asarray(rgb, dtype=np.float32)
+
+        if len(rgb) == 1 and opacity.max(initial=0.0) < 1.0:
+            self._fill_color(c0[drawn], c1[drawn], r0[drawn], r1[drawn], rgb[0], opacity[drawn])
+            return
+
+        rgb = np.broadcast_to(rgb, (len(x0), 3))
+
+        pixels = self.pixels
+
+        for c0, c1, r0, r1, color, opacity in zip(c0[drawn].tolist(),
+                                                  c1[drawn].tolist(),
+                                                  r0[drawn].tolist(),
+                                                  r1[drawn].tolist(),
+                                                  rgb[drawn],
+                                                  opacity[drawn].tolist()):
+            block = pixels[r0:r1, c0:c1]
+            block *= 1.0 - opacity
+            block += opacity * color
+
+    def _fill_color(self, c0, c1, r0, r1, color, opacity):
+        """Blend pixel rectangles of one color into the image
+
+        Blending a color over a pixel with opacity a leaves (1 - a) of
+        the difference from the color, so the result does not depend
+        on the order of the rectangles, only on the product of (1 - a)
+        over the rectangles covering each pixel. The product is found
+        for all the pixels at once by summing log(1 - a) over a 2D
+        difference array.
+
+        """
+
+        height, width = self.height, self.width
+
+        log_transparency = np.log1p(-opacity)
+
+        # Add log(1 - a) from (r0, c0) to the bottom right and cancel
+        # it out past r1 and c1
+        corners = np.concatenate([r0 * (width + 1) + c0,
+                                  r0 * (width + 1) + c1,
+                                  r1 * (width + 1) + c0,
+                                  r1 * (width + 1) + c1])
+        weights = np.concatenate([log_transparency,
+                                  -log_transparency,
+                                  -log_transparency,
+                                  log_transparency])
+
+        differences = np.bincount(corners, weights=weights, minlength=(height + 1) * (width + 1))
+        differences = differences.reshape(height + 1, width + 1)
+
+        transparency = np.exp(differences.cumsum(axis=0).cumsum(axis=1)[:height, :width])
+
+        pixels = self.pixels
+        pixels -= color
+        pixels *= transparency[..., np.newaxis].astype(np.float32)
+        pixels += color
+
+    def hlines(self, start, end, util, rgb, dotted=False, line_width=None):
+        """ Draw horizontal lines from start to end at util (in data coordinates) """
+
+        line_width = self.line_width if line_width is None else line_width
+
+        c0 = np.floor(self.columns(start) + 0.5)
+        c1 = np.maximum(np.floor(self.columns(end) + 0.5), c0 + 1)
+
+        r0 = np.floor(self.rows(util) - line_width / 2 + 0.5)
+        r1 = r0 + line_width
+
+        self._draw(c0, c1, r0, r1, rgb, dotted, line_width)
+
+    def vlines(self, time, util0, util1, rgb, line_width=None):
+        """ Draw vertical lines at time from util0 to util1 (in data coordinates) """
+
+        line_width = self.line_width if line_width is None else line_width
+
+        c0 = np.floor(self.columns(time) - line_width / 2 + 0.5)
+        c1 = c0 + line_width
+
+        rows0 = self.rows(util0)
+        rows1 = self.rows(util1)
+
+        r0 = np.floor(np.minimum(rows0, rows1) + 0.5)
+        r1 = np.maximum(np.floor(np.maximum(rows0, rows1) + 0.5), r0 + 1)
+
+        self._draw(c0, c1, r0, r1, rgb, False, line_width)
+
+    def _draw(self, c0, c1, r0, r1, rgb, dotted, line_width):
+        """ Paint (opaque) pixel rectangles in order """
+
+        c0, c1 = _clip(c0, c1, self.width)
+        r0, r1 = _clip(r0, r1, self.height)
+
+        drawn = (c1 > c0) & (r1 > r0)
+
+        rgb = np.broadcast_to(np.asarray(rgb, dtype=np.float32), (len(c0), 3))
+
+        # Dots (as for a ':' line) are one line width long with two
+        # line widths between them
+        period = 3 * line_width
+        dots = (np.arange(self.width) % period) < line_width
+
+        pixels = self.pixels
+
+        for c0, c1, r0, r1, color in zip(c0[drawn].tolist(),
+                                         c1[drawn].tolist(),
+                                         r0[drawn].tolist(),
+                                         r1[drawn].tolist(),
+                                         rgb[drawn]):
+            if dotted:
+                pixels[r0:r1, c0:c1][:, dots[c0:c1]] = color
+            else:
+                pixels[r0:r1, c0:c1] = color
+
+    def image(self):
+        """ Return the image as (height, width, 3) uint8 RGB values """
+
+        return np.clip(np.rint(self.pixels * 255), 0, 255).astype(np.uint8)
+
+
+def _clip(low, high, size):
+    """ Clip integer pixel ranges low:high to 0:size """
+
+    return (np.clip(low, 0, size).astype(np.int64),
+            np.clip(high, 0, size).astype(np.int64))
+
+
+def _rgb_array(colors):
+    """ Convert "#RRGGBB" (or named) colors to an (n, 3) array of 0-1 values """
+
+    rgb = np.zeros((len(colors), 3), dtype=np.float32)
+
+    for n, color in enumerate(colors):
+        if color is None:
+            continue
+
+        color = NAMED_COLORS.get(color, color)
+
+        rgb[n] = [int(color[i:i+2], 16) / 255 for i in (1, 3, 5)]
+
+    return rgb
+
+
+def encode_png(image, compression=6):
+    """Encode an image as a PNG with the standard library
+
+    The image is a (height, width, 3) uint8 RGB array (or (height,
+    width) for grayscale). Returns the bytes of the PNG file.
+
+    """
+
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+
+    if image.ndim == 2:
+        height, width = image.shape
+        color_type = 0
+    elif image.ndim == 3 and image.shape[2] == 3:
+        height, width, _ = image.shape
+        color_type = 2
+    else:
+        raise ValueError(f"Unsupported image shape: {image.shape}")
+
+    # Each row starts with its filter type (0 = None)
+    rows = image.reshape(height, -1)
+    raw = np.zeros((height, rows.shape[1] + 1), dtype=np.uint8)
+    raw[:, 1:] = rows
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) +
+                kind + data +
+                struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(raw.tobytes(), compression)) +
+            chunk(b"IEND", b""))
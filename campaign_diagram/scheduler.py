@@ -0,0 +1,356 @@
+import heapq
+import random
+
+#
+# Utilization that may be used at any time for compute and bw
+#
+CAPACITY = 1.0
+
+# Slack for rounding when adding up utilizations
+EPSILON = 1e-9
+
+# Smallest increase in the rate of a running kernel worth splitting it for
+RATE_STEP = 1e-6
+
+# Limits on dilating a kernel to start it tried by list_schedule() (in
+# order)
+DILATION_LIMITS = (1.0, 2.0, float("inf"), 1.5, 4.0)
+
+
+def list_schedule(kernels, stages=2, budget=32, seed=0):
+    """Schedule the tiles of a pipeline within the resource capacity
+
+    Tile i (see Cascade.pipeline()) runs in stage i % stages, after
+    the tile before it in the previous stage (i-1) and the tile before
+    it in the same stage (i-stages). A kernel that on its own uses more
+    than the capacity of compute or bw, or more bw than its
+    bw_util_limit, is dilated until it doesn't.
+
+    The tiles are placed with list scheduling: whenever a kernel
+    starts or ends, the running kernels get a rate (the inverse of
+    how much they are dilated), and ready kernels are started in
+    priority order if that dilates them by at most a limit. The rates
+    are either shared (all running kernels are dilated equally, as
+    throttling would) or handed out in priority order, speeding up
+    running kernels before starting new ones. A kernel whose rate
+    changes is split into pieces. Up to "budget" combinations of a
+    priority order, a dilation limit and a way of handing out the
+    rates are tried: first the critical path and the pipeline order
+    with every limit and way (20 combinations), then random variations
+    of the critical path, limit and way (seeded by seed). The step
+    schedule of Cascade.pipeline() throttled (see _step_schedule()) is
+    tried too, and the schedule with the shortest makespan is kept, so
+    it is never longer than throttling the step schedule.
+
+    Returns a tuple (pieces, makespan), where pieces is a list of
+    (kernel index, start, end, dilation) with one or more pieces for
+    each kernel.
+
+    """
+
+    num_kernels = len(kernels)
+
+    fit_dilations = [_dilation(kernel) for kernel in kernels]
+
+    successors = [[] for _ in range(num_kernels)]
+
+    for index in range(num_kernels):
+        if (index + 1) % stages != 0 and index + 1 < num_kernels:
+            successors[index].append(index + 1)
+
+        if index + stages < num_kernels:
+            successors[index].append(index + stages)
+
+    # Length of the longest chain of kernels starting with each kernel
+    critical_path = [0.0] * num_kernels
+
+    for index in reversed(range(num_kernels)):
+        critical_path[index] = (kernels[index].duration * fit_dilations[index]
+                                + max((critical_path[successor]
+                                       for successor in successors[index]),
+                                      default=0.0))
+
+    priorities = [[-length for length in critical_path],
+                  [index // stages + index % stages for index in range(num_kernels)]]
+
+    candidates = [(priority, max_dilation, shared)
+                  for max_dilation in DILATION_LIMITS
+                  for shared in (True, False)
+                  for priority in priorities]
+
+    generator = random.Random(seed)
+
+    while len(candidates) < budget:
+        priority = [-length * generator.uniform(0.9, 1.1) for length in critical_path]
+        candidates.append((priority,
+                           generator.choice(DILATION_LIMITS),
+                           generator.choice((True, False))))
+
+    best = _step_schedule(kernels, fit_dilations, stages)
+
+    for priority, max_dilation, shared in candidates[:max(budget, 1)]:
+        schedule = _schedule(kernels, fit_dilations, successors, priority, max_dilation, shared)
+
+        if schedule[1] < best[1]:
+            best = schedule
+
+    return best
+
+
+def _dilation(kernel):
+    """ Dilation that makes a kernel fit on its own """
+
+    bw_capacity = CAPACITY
+
+    if kernel.bw_util_limit is not None and kernel.bw_util_limit > 0:
+        bw_capacity = min(bw_capacity, kernel.bw_util_limit)
+
+    return max(1.0, kernel.compute_util / CAPACITY, kernel.bw_util / bw_capacity)
+
+
+def _step_schedule(kernels, fit_dilations, stages):
+    """The step schedule of Cascade.pipeline() as throttling leaves it
+
+    The tiles of a step start together when the step before ends.
+    Between the ends of the tiles, the running tiles are all dilated
+    by the most compute or bw they use together (as throttle() does),
+    or more if one of them needs it to fit on its own.
+
+    Returns a tuple (pieces, makespan), see list_schedule().
+
+    """
+
+    num_kernels = len(kernels)
+
+    # Number of steps until the stage with the fewest tiles is done
+    num_steps = stages - 1 + min(len(range(stage, num_kernels, stages))
+                                 for stage in range(stages))
+
+    pieces = []
+    time = 0.0
+
+    for step in range(num_steps):
+        indices = [stage + (step - stage) * stages for stage in range(min(step + 1, stages))]
+
+        # Running tiles (skipping tiles with duration == 0) and how
+        # much of the undilated step is done
+        running = [index for index in indices
+                   if index < num_kernels and kernels[index].duration > 0]
+        done = 0.0
+
+        while running:
+            dilation = max(max(CAPACITY,
+                               sum(kernels[index].compute_util for index in running),
+                               sum(kernels[index].bw_util for index in running)) / CAPACITY,
+                           max(fit_dilations[index] for index in running))
+
+            next_done = min(kernels[index].duration for index in running)
+            end = time + (next_done - done) * dilation
+
+            pieces.extend((index, time, end, dilation) for index in running)
+
+            running = [index for index in running if kernels[index].duration > next_done]
+            done = next_done
+            time = end
+
+    return pieces, time
+
+
+def _schedule(kernels, fit_dilations, successors, priority, max_dilation, shared):
+    """List schedule with a priority (lowest first) for each kernel
+
+    Each running kernel runs at a rate (the inverse of its dilation
+    beyond fit_dilations), and a new piece of it starts whenever the
+    rate changes. If shared, all running kernels run at the same rate
+    (as throttling would give them), otherwise the rates are handed
+    out in priority order and only go up.
+
+    Returns a tuple (pieces, makespan), see list_schedule().
+
+    """
+
+    num_kernels = len(kernels)
+
+    # Duration and utilizations of the kernels dilated to fit
+    durations = [kernel.duration * dilation for kernel, dilation in zip(kernels, fit_dilations)]
+    compute_utils = [kernel.compute_util / dilation for kernel, dilation in zip(kernels, fit_dilations)]
+    bw_utils = [kernel.bw_util / dilation for kernel, dilation in zip(kernels, fit_dilations)]
+
+    predecessors = [0] * num_kernels
+    for index in range(num_kernels):
+        for successor in successors[index]:
+            predecessors[successor] += 1
+
+    ready = [(priority[index], index) for index in range(num_kernels) if predecessors[index] == 0]
+    heapq.heapify(ready)
+
+    # (priority, kernel) of the running kernels, in priority order
+    running = []
+
+    # Rate, start time and fraction of the kernel done before the
+    # current piece of each running kernel
+    rates = [0.0] * num_kernels
+    piece_starts = [0.0] * num_kernels
+    done = [0.0] * num_kernels
+
+    pieces = []
+    makespan = 0.0
+    time = 0.0
+
+    while ready or running:
+        if shared:
+            new_rates, ready = _shared_rates(running, ready, compute_utils, bw_utils, max_dilation)
+        else:
+            new_rates, ready = _priority_rates(running, ready, rates, compute_utils, bw_utils,
+                                               max_dilation)
+
+        for key, index in running:
+            rate = new_rates.pop((key, index))
+
+            if rate == rates[index]:
+                continue
+
+            if time > piece_starts[index]:
+                pieces.append((index, piece_starts[index], time, fit_dilations[index] / rates[index]))
+
+                done[index] += (time - piece_starts[index]) * rates[index] / durations[index]
+
+            rates[index] = rate
+            piece_starts[index] = time
+
+        # The remaining rates are for the kernels that start
+        for (key, index), rate in new_rates.items():
+            rates[index] = rate
+            piece_starts[index] = time
+            done[index] = 0.0
+
+            running.append((key, index))
+
+        running.sort()
+
+        # Advance to the end of the next kernel(s)
+        ends = [piece_starts[index] + durations[index] * (1.0 - done[index]) / rates[index]
+                for _, index in running]
+
+        time = min(ends)
+        makespan = max(makespan, time)
+
+        still_running = []
+
+        for (key, index), end in zip(running, ends):
+            # Kernels ending within rounding of each other end together
+            if end - time > EPSILON * time:
+                still_running.append((key, index))
+                continue
+
+            pieces.append((index, piece_starts[index], time, fit_dilations[index] / rates[index]))
+
+            for successor in successors[index]:
+                predecessors[successor] -= 1
+
+                if predecessors[successor] == 0:
+                    heapq.heappush(ready, (priority[successor], successor))
+
+        running = still_running
+
+    return pieces, makespan
+
+
+def _priority_rates(running, ready, rates, compute_utils, bw_utils, max_dilation):
+    """Rates of the running kernels and the ready kernels to start
+
+    The unused compute and bw is used to speed up the running kernels
+    and then to start ready kernels, in priority order.
+
+    Returns a tuple (rates by (priority, kernel), kernels still ready).
+
+    """
+
+    compute_unused = CAPACITY - sum(compute_utils[index] * rates[index] for _, index in running)
+    bw_unused = CAPACITY - sum(bw_utils[index] * rates[index] for _, index in running)
+
+    new_rates = {}
+
+    for key, index in running:
+        rate = min(1.0,
+                   rates[index] + _fit(compute_utils[index], compute_unused),
+                   rates[index] + _fit(bw_utils[index], bw_unused))
+
+        if rate <= rates[index] + RATE_STEP:
+            rate = rates[index]
+
+        compute_unused -= compute_utils[index] * (rate - rates[index])
+        bw_unused -= bw_utils[index] * (rate - rates[index])
+
+        new_rates[(key, index)] = rate
+
+    waiting = []
+
+    while ready:
+        key, index = heapq.heappop(ready)
+
+        rate = min(_fit(compute_utils[index], compute_unused),
+                   _fit(bw_utils[index], bw_unused))
+
+        if rate > 0 and rate * max_dilation >= 1.0 - EPSILON:
+            compute_unused -= compute_utils[index] * rate
+            bw_unused -= bw_utils[index] * rate
+
+            new_rates[(key, index)] = rate
+        else:
+            waiting.append((key, index))
+
+    heapq.heapify(waiting)
+
+    return new_rates, waiting
+
+
+def _shared_rates(running, ready, compute_utils, bw_utils, max_dilation):
+    """Rates of the running kernels and the ready kernels to start
+
+    Ready kernels are started in priority order as long as running
+    all of the kernels at the same rate dilates them by at most
+    max_dilation.
+
+    Returns a tuple (rates by (priority, kernel), kernels still ready).
+
+    """
+
+    compute_used = sum(compute_utils[index] for _, index in running)
+    bw_used = sum(bw_utils[index] for _, index in running)
+
+    started = []
+    waiting = []
+
+    while ready:
+        key, index = heapq.heappop(ready)
+
+        dilation = max(CAPACITY,
+                       compute_used + compute_utils[index],
+                       bw_used + bw_utils[index]) / CAPACITY
+
+        if dilation <= max_dilation * (1.0 + EPSILON) or not (running or started):
+            compute_used += compute_utils[index]
+            bw_used += bw_utils[index]
+
+            started.append((key, index))
+        else:
+            waiting.append((key, index))
+
+    heapq.heapify(waiting)
+
+    rate = CAPACITY / max(CAPACITY, compute_used, bw_used)
+
+    return {kernel: rate for kernel in running + started}, waiting
+
+
+def _fit(util, unused):
+    """ Rate (at most 1.0) at which util fits in the unused capacity """
+
+    if util <= unused + EPSILON:
+        return 1.0
+
+    if unused <= EPSILON:
+        return 0.0
+
+    return unused / util
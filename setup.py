@@ -9,8 +9,8 @@ setup(
     url='https://github.com/jsemer/campaign_diagram_tools',
     packages=find_packages(),
     install_requires=[
-        'deprecated',
         'matplotlib',  # Dependency for plotting
+        'numpy',
         'ruamel.yaml',
     ],
     classifiers=[